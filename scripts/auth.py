@@ -0,0 +1,30 @@
+import logging
+import os
+from functools import lru_cache
+from google.oauth2.service_account import Credentials
+from config_loader import service_account_key_path
+
+logger = logging.getLogger(__name__)
+
+# Scopes needed by the Sheets, Storage and Text-to-Speech clients
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/cloud-platform"
+]
+
+def get_credentials(key_path=None):
+    """
+    Returns service account credentials for the given key file, parsing the key only
+    once per process so the Sheets, Storage and Text-to-Speech clients can share it.
+
+    :param key_path: Path to the service account key JSON file; defaults to the configured key.
+    :return: Service account credentials covering all SCOPES.
+    """
+    # Normalize the path so that callers passing the key explicitly and callers relying on
+    # the default hit the same cache entry
+    return _load_credentials(os.path.abspath(key_path or service_account_key_path))
+
+@lru_cache(maxsize=4)
+def _load_credentials(key_path):
+    logger.info(f"Loading service account credentials from {key_path}")
+    return Credentials.from_service_account_file(key_path, scopes=SCOPES)
@@ -1,67 +1,104 @@
 import os
 import logging
+from functools import lru_cache
+from multiprocessing import cpu_count
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
-
 # Initialize logger
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-# Get the client name and other variables from the environment
-client_name = os.getenv('CLIENT_NAME')
-
-# Dynamic paths for each client's resources
-service_account_key_path = os.getenv('SERVICE_ACCOUNT_KEY_PATH')
-google_sheet_id = os.getenv('GOOGLE_SHEET_ID')
-voiceover_bucket_name = os.getenv("VOICEOVER_BUCKET_NAME")
-video_bucket_name = os.getenv("VIDEO_BUCKET_NAME")
-cover_image_bucket_name = os.getenv("COVER_IMAGE_BUCKET_NAME")
-
-# Paths for configuration files and client-specific resources
-audio_config_path = os.getenv('AUDIO_CONFIG_PATH')
-video_config_path = os.getenv('VIDEO_CONFIG_PATH')
-customer_info_sheet = os.getenv('CUSTOMER_INFO_SHEET_PATH')
-background_music_path = os.getenv('BACKGROUND_MUSIC_PATH')
-templates_folder = os.getenv('TEMPLATES_FOLDER')
-
-# Path for overlay mapping
-customer_info_mapping_path = os.getenv('CUSTOMER_INFO_MAPPING_PATH')
-
-# Path for voiceovers should be dynamically picked up
-voiceovers_dir = os.getenv('VOICEOVERS_DIR')
-videos_dir = os.getenv('VIDEOS_DIR')
-cover_images_dir = os.getenv('COVER_IMAGES_DIR')
-
-# Max Users
-max_users = int(os.getenv('MAX_USERS', 2))  # Set a default value like 10 if needed
-
-# Image Magick Binary
-imagemagick_binary_path = os.getenv("IMAGEMAGICK_BINARY_PATH")
-
-# Check if paths exist
-required_paths = [
-    service_account_key_path,
-    audio_config_path,
-    video_config_path,
-    customer_info_sheet,
-    background_music_path,
-    templates_folder
-]
-
-for path in required_paths:
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Required file or folder not found: {path}")
-
-if not os.path.exists(voiceovers_dir):
-    os.makedirs(voiceovers_dir, exist_ok=True)
-    logger.info(f"Voiceovers directory created at {voiceovers_dir}")
-
-if not os.path.exists(videos_dir):
-    os.makedirs(videos_dir, exist_ok=True)
-    logger.info(f"Videos directory created at {videos_dir}")
-
-if not os.path.exists(cover_images_dir):
-    os.makedirs(cover_images_dir, exist_ok=True)
-    logger.info(f"Cover Images directory created at {cover_images_dir}")
+# Settings are read from the environment lazily, the first time each one is imported,
+# so processes that only need a couple of values don't pay for all of them.
+_settings = {
+    # Get the client name and other variables from the environment
+    'client_name': lambda: os.getenv('CLIENT_NAME'),
+
+    # Dynamic paths for each client's resources
+    'service_account_key_path': lambda: os.getenv('SERVICE_ACCOUNT_KEY_PATH'),
+    'google_sheet_id': lambda: os.getenv('GOOGLE_SHEET_ID'),
+    'voiceover_bucket_name': lambda: os.getenv("VOICEOVER_BUCKET_NAME"),
+    'video_bucket_name': lambda: os.getenv("VIDEO_BUCKET_NAME"),
+    'cover_image_bucket_name': lambda: os.getenv("COVER_IMAGE_BUCKET_NAME"),
+
+    # Paths for configuration files and client-specific resources
+    'audio_config_path': lambda: os.getenv('AUDIO_CONFIG_PATH'),
+    'video_config_path': lambda: os.getenv('VIDEO_CONFIG_PATH'),
+    'customer_info_sheet': lambda: os.getenv('CUSTOMER_INFO_SHEET_PATH'),
+    'background_music_path': lambda: os.getenv('BACKGROUND_MUSIC_PATH'),
+    'templates_folder': lambda: os.getenv('TEMPLATES_FOLDER'),
+
+    # Path for overlay mapping
+    'customer_info_mapping_path': lambda: os.getenv('CUSTOMER_INFO_MAPPING_PATH'),
+
+    # Path for voiceovers should be dynamically picked up
+    'voiceovers_dir': lambda: os.getenv('VOICEOVERS_DIR'),
+    'videos_dir': lambda: os.getenv('VIDEOS_DIR'),
+    'cover_images_dir': lambda: os.getenv('COVER_IMAGES_DIR'),
+
+    # Append-only record of processed user keys, so a restarted job skips them
+    'processed_log_path': lambda: os.getenv('PROCESSED_LOG_PATH', os.path.join(_setting('videos_dir'), 'processed.log')),
+
+    # Max Users
+    'max_users': lambda: int(os.getenv('MAX_USERS', 2)),  # Set a default value like 10 if needed
+
+    # Worker processes; kept low by default so Sheets/GCS fan-out stays under API quotas
+    'pool_size': lambda: int(os.getenv('POOL_SIZE', min(cpu_count(), 4))),
+
+    # Image Magick Binary
+    'imagemagick_binary_path': lambda: os.getenv("IMAGEMAGICK_BINARY_PATH"),
+}
+
+@lru_cache(maxsize=1)
+def _load_env():
+    # Load environment variables from .env file
+    load_dotenv()
+
+def _setting(name):
+    """
+    Resolves a setting on first access and caches it as a module attribute.
+    """
+    if name in globals():
+        return globals()[name]
+    _load_env()
+    value = _settings[name]()
+    globals()[name] = value
+    return value
+
+def __getattr__(name):
+    if name not in _settings:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return _setting(name)
+
+def validate():
+    """
+    Checks that the required client files exist and creates the output directories.
+    Called once by the main process before any work starts.
+    """
+    # Check if paths exist
+    required_paths = [
+        _setting('service_account_key_path'),
+        _setting('audio_config_path'),
+        _setting('video_config_path'),
+        _setting('customer_info_sheet'),
+        _setting('background_music_path'),
+        _setting('templates_folder')
+    ]
+
+    # Stat each distinct path once, even if several settings point at the same location
+    path_exists = {path: os.path.exists(path) for path in required_paths}
+
+    for path, exists in path_exists.items():
+        if not exists:
+            raise FileNotFoundError(f"Required file or folder not found: {path}")
+
+    output_dirs = {
+        "Voiceovers": _setting('voiceovers_dir'),
+        "Videos": _setting('videos_dir'),
+        "Cover Images": _setting('cover_images_dir')
+    }
+
+    for label, directory in output_dirs.items():
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+            logger.info(f"{label} directory created at {directory}")
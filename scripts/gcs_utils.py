@@ -1,16 +1,127 @@
 import os
 import logging
+from functools import lru_cache
+from google.api_core.exceptions import GoogleAPICallError, NotFound
 from google.cloud import storage
-from config_loader import service_account_key_path
-from google.oauth2.service_account import Credentials
+from google.cloud.storage import transfer_manager
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout as RequestsTimeout
+from auth import get_credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 
 
 logger = logging.getLogger(__name__)
 
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from tenacity.wait import wait_base
+
+# Longest wait between attempts, also applied to the server's Retry-After
+MAX_RETRY_WAIT = 32
+
+def _is_retryable_status(status):
+    """
+    Returns whether an HTTP status is worth retrying: request timeouts, rate limiting
+    and server errors. Other 4xx errors (400, 403, 404, ...) fail the same way again.
+    """
+    return status in (408, 429) or 500 <= status < 600
+
+def _retry_after_seconds(exception):
+    """
+    Returns the delay requested by the server's Retry-After header, or None if the
+    error carries no usable (numeric) Retry-After.
+    """
+    if isinstance(exception, HttpError):
+        headers = exception.resp  # httplib2 response, a dict of lower-cased headers
+    else:
+        headers = getattr(getattr(exception, 'response', None), 'headers', None)
+
+    if not headers:
+        return None
+
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+class wait_retry_after(wait_base):
+    """
+    Waits as long as the server asked for via Retry-After, falling back to another
+    wait strategy when no such header is present.
+    """
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def __call__(self, retry_state):
+        retry_after = _retry_after_seconds(retry_state.outcome.exception())
+        if retry_after is not None:
+            return min(retry_after, MAX_RETRY_WAIT)
+        return self.fallback(retry_state)
+
+# Jitter keeps the pool workers from retrying in lockstep
+retry_wait = wait_retry_after(wait_exponential_jitter(initial=1, max=MAX_RETRY_WAIT, jitter=2))
+
+def _is_retryable_sheets_error(exception):
+    if isinstance(exception, HttpError):
+        return _is_retryable_status(exception.resp.status)
+    return isinstance(exception, ConnectionError)
+
+def _is_retryable_gcs_error(exception):
+    if isinstance(exception, GoogleAPICallError):
+        return exception.code is not None and _is_retryable_status(exception.code)
+    # Upload errors raised below the API layer carry the raw HTTP response
+    status = getattr(getattr(exception, 'response', None), 'status_code', None)
+    if status is not None:
+        return _is_retryable_status(status)
+    return isinstance(exception, (ConnectionError, RequestsConnectionError, RequestsTimeout))
+
+# Storage API endpoint used by the shared client
+STORAGE_API_ENDPOINT = "https://storage.googleapis.com"
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=10))  # Retries up to 3 times with exponential backoff
+# Connections kept open per host; covers the concurrent part uploads and bulk transfers of a worker
+HTTP_POOL_MAXSIZE = 32
+
+# Storage client shared by all blob helpers in this process
+_storage_client = None
+
+def get_storage_client():
+    """
+    Returns the process-wide storage client, creating it on first use.
+
+    Reusing one client keeps its HTTP session (and keep-alive connections) alive
+    across blob operations instead of re-authenticating on every call.
+    """
+    global _storage_client
+    if _storage_client is None:
+        credentials = get_credentials()
+
+        # Widen the session's connection pool beyond requests' default of 10
+        session = AuthorizedSession(credentials)
+        session.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE))
+
+        _storage_client = storage.Client(
+            project=credentials.project_id,
+            credentials=credentials,
+            client_options={"api_endpoint": STORAGE_API_ENDPOINT},
+            _http=session
+        )
+    return _storage_client
+
+def gcs_url(bucket_name, file_path):
+    """
+    Returns the URL a local file is served from once uploaded by upload_to_gcs.
+    """
+    return f"https://storage.cloud.google.com/{bucket_name}/{os.path.basename(file_path)}"
+
+@lru_cache(maxsize=8)
+def _bucket(bucket_name):
+    """
+    Returns the Bucket object for a bucket name, reused across blob operations.
+    """
+    return get_storage_client().bucket(bucket_name)
+
+@retry(stop=stop_after_attempt(3), wait=retry_wait, retry=retry_if_exception(_is_retryable_gcs_error))  # Retries transient errors up to 3 times with jittered exponential backoff
 def download_from_gcs(bucket_name, blob_name, local_path):
     """
     Downloads a file (blob) from Google Cloud Storage (GCS).
@@ -25,8 +136,7 @@ def download_from_gcs(bucket_name, blob_name, local_path):
         bool: True if the download was successful, False otherwise.
     """
     try:
-        storage_client = storage.Client.from_service_account_json(service_account_key_path)
-        bucket = storage_client.bucket(bucket_name)
+        bucket = _bucket(bucket_name)
         blob = bucket.blob(blob_name)
         blob.download_to_filename(local_path)
         logger.info(f"Downloaded {blob_name} to {local_path}.")
@@ -35,7 +145,14 @@ def download_from_gcs(bucket_name, blob_name, local_path):
         logger.error(f"Error downloading {blob_name} from GCS: {e}")
         raise  # Re-raise exception to trigger retry
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=10))  # Retries up to 3 times with exponential backoff
+# Uploads larger than the threshold are split into chunks sent concurrently
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+PARALLEL_UPLOAD_THRESHOLD = 32 * 1024 * 1024
+PARALLEL_UPLOAD_MAX_WORKERS = 4
+# Seconds allowed for a single-request upload
+UPLOAD_TIMEOUT = 60
+
+@retry(stop=stop_after_attempt(3), wait=retry_wait, retry=retry_if_exception(_is_retryable_gcs_error))  # Retries transient errors up to 3 times with jittered exponential backoff
 def upload_to_gcs(bucket_name, file_path):
     """
     Uploads a file to Google Cloud Storage (GCS).
@@ -49,20 +166,42 @@ def upload_to_gcs(bucket_name, file_path):
         str: URL of the uploaded file on GCS, or None if an error occurs.
     """
     try:
-        storage_client = storage.Client.from_service_account_json(service_account_key_path)
-        bucket = storage_client.bucket(bucket_name)
+        bucket = _bucket(bucket_name)
         blob_name = os.path.basename(file_path)
-        blob = bucket.blob(blob_name)
+        file_size = os.path.getsize(file_path)
+
+        # Files under one chunk (e.g. cover images) go up in a single multipart request
+        # rather than through the two-phase resumable protocol
+        blob = bucket.blob(blob_name, chunk_size=UPLOAD_CHUNK_SIZE if file_size >= UPLOAD_CHUNK_SIZE else None)
         
-        blob.upload_from_filename(file_path)
+        if file_size > PARALLEL_UPLOAD_THRESHOLD:
+            # Large videos: upload parts over several connections and let GCS assemble them
+            transfer_manager.upload_chunks_concurrently(
+                file_path,
+                blob,
+                chunk_size=UPLOAD_CHUNK_SIZE,
+                max_workers=PARALLEL_UPLOAD_MAX_WORKERS,
+                worker_type=transfer_manager.THREAD
+            )
+        else:
+            blob.upload_from_filename(file_path, checksum="crc32c", timeout=UPLOAD_TIMEOUT)
+        _blob_exists_cached.cache_clear()
         #logger.info(f"Uploaded {file_path} to {bucket_name}/{blob_name}.")
         
-        return f"https://storage.cloud.google.com/{bucket_name}/{blob_name}"
+        return gcs_url(bucket_name, file_path)
     
     except Exception as e:
         logger.error(f"Error uploading {file_path} to GCS: {e}")
         raise  # Re-raise exception to trigger retry
 
+@lru_cache(maxsize=1024)
+def _blob_exists_cached(bucket_name, blob_name):
+    """
+    Returns whether a blob exists, probing GCS only the first time a name is seen.
+    The cache is cleared whenever this module uploads or deletes a blob.
+    """
+    return _bucket(bucket_name).blob(blob_name).exists()
+
 def manage_blob(bucket_name, blob_name, delete=False):
     """
     Checks if a blob exists in the specified bucket and optionally deletes it.
@@ -77,13 +216,21 @@ def manage_blob(bucket_name, blob_name, delete=False):
         bool: True if the blob exists (or was deleted), False otherwise.
     """
     try:
-        storage_client = storage.Client.from_service_account_json(service_account_key_path)
-        bucket = storage_client.bucket(bucket_name)
+        bucket = _bucket(bucket_name)
         blob = bucket.blob(blob_name)
         
-        if blob.exists():
+        if _blob_exists_cached(bucket_name, blob_name):
             if delete:
-                blob.delete()
+                try:
+                    blob.delete()
+                except NotFound:
+                    # The cached answer was stale; re-check once before giving up
+                    _blob_exists_cached.cache_clear()
+                    if not _blob_exists_cached(bucket_name, blob_name):
+                        logger.info(f"Blob {blob_name} does not exist.")
+                        return False
+                    blob.delete()
+                _blob_exists_cached.cache_clear()
                 logger.info(f"Blob {blob_name} deleted successfully.")
             return True
         else:
@@ -95,7 +242,63 @@ def manage_blob(bucket_name, blob_name, delete=False):
         return False
 
 import time
-from googleapiclient.errors import HttpError
+import threading
+import multiprocessing
+
+# Number of rows buffered per sheet (tab) before they are appended in one request
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', 50))
+
+# Seconds between background flushes, so partial batches don't wait for shutdown
+SHEETS_FLUSH_INTERVAL = float(os.getenv('SHEETS_FLUSH_INTERVAL', 5))
+
+# Sheets API pacing: at most SHEETS_MAX_CONCURRENT calls in flight and SHEETS_MIN_INTERVAL
+# seconds between calls (0.2s = 300 requests per minute). The limits cover every process that
+# shares the pacing state (see share_sheets_pacing); otherwise they apply to this process alone
+SHEETS_MAX_CONCURRENT = int(os.getenv('SHEETS_MAX_CONCURRENT', 1))
+SHEETS_MIN_INTERVAL = float(os.getenv('SHEETS_MIN_INTERVAL', 0.2))
+
+_sheets_semaphore = threading.Semaphore(SHEETS_MAX_CONCURRENT)
+_sheets_pacing_lock = threading.Lock()
+_sheets_last_call = multiprocessing.RawValue('d', 0.0)  # time.monotonic() of the last call
+
+def share_sheets_pacing():
+    """
+    Replaces this process's Sheets pacing state with state that can be shared with worker
+    processes, so the parent and all pool workers stay under one combined request rate.
+
+    Returns:
+        tuple: The shared pacing state, to hand to use_sheets_pacing in each worker.
+    """
+    pacing = (multiprocessing.BoundedSemaphore(SHEETS_MAX_CONCURRENT), multiprocessing.Lock(), multiprocessing.RawValue('d', 0.0))
+    use_sheets_pacing(pacing)
+    return pacing
+
+def use_sheets_pacing(pacing):
+    """
+    Makes this process pace its Sheets API calls with pacing state from share_sheets_pacing.
+
+    Args:
+        pacing (tuple): The shared (semaphore, lock, last call time) state.
+    """
+    global _sheets_semaphore, _sheets_pacing_lock, _sheets_last_call
+    _sheets_semaphore, _sheets_pacing_lock, _sheets_last_call = pacing
+
+@retry(stop=stop_after_attempt(5), wait=retry_wait, retry=retry_if_exception(_is_retryable_sheets_error), reraise=True)
+def _execute_sheets_request(request):
+    """
+    Executes a Sheets API request, waiting for a free slot and for the minimum
+    interval since the previous call so workers stay under the quota instead of
+    running into 429s. Rate-limit and transient server errors are retried,
+    honouring the server's Retry-After when it sends one.
+    """
+    with _sheets_semaphore:
+        # The monotonic clock is system-wide, so the last call time is comparable across processes
+        with _sheets_pacing_lock:
+            wait = _sheets_last_call.value + SHEETS_MIN_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            _sheets_last_call.value = time.monotonic()
+        return request.execute()
 
 class GoogleSheetsManager:
     def __init__(self, service_account_key_path, sheet_id):
@@ -107,6 +310,10 @@ class GoogleSheetsManager:
         """
         self.sheet_id = sheet_id
         self.service = self._get_sheets_service(service_account_key_path)
+        self._pending = {}  # Rows waiting to be appended, keyed by sheet (tab) name
+        self._known_sheets = set()  # Sheets (tabs) already confirmed to exist
+        self._lock = threading.Lock()  # Guards _pending between callers and the flush thread
+        self._flush_thread = None
 
     def _get_sheets_service(self, service_account_key_path):
         """
@@ -115,10 +322,7 @@ class GoogleSheetsManager:
         :param service_account_key_path: Path to the service account key JSON file.
         :return: Google Sheets API service instance.
         """
-        credentials = Credentials.from_service_account_file(
-            service_account_key_path, 
-            scopes=["https://www.googleapis.com/auth/spreadsheets"]
-        )
+        credentials = get_credentials(service_account_key_path)
         service = build('sheets', 'v4', credentials=credentials)
         return service
 
@@ -128,13 +332,18 @@ class GoogleSheetsManager:
         
         :param sheet_name: The name of the sheet (tab) to create.
         """
+        if sheet_name in self._known_sheets:
+            return  # Already checked or created during this run
+
         # Check if the sheet already exists
-        sheet_metadata = self.service.spreadsheets().get(spreadsheetId=self.sheet_id).execute()
+        sheet_metadata = _execute_sheets_request(self.service.spreadsheets().get(spreadsheetId=self.sheet_id))
         sheets = sheet_metadata.get('sheets', '')
         
         for sheet in sheets:
-            if sheet.get("properties", {}).get("title") == sheet_name:
-                return  # Sheet already exists, no need to create
+            self._known_sheets.add(sheet.get("properties", {}).get("title"))
+
+        if sheet_name in self._known_sheets:
+            return  # Sheet already exists, no need to create
         
         # If the sheet doesn't exist, create it
         requests = [{
@@ -149,10 +358,11 @@ class GoogleSheetsManager:
             'requests': requests
         }
         
-        self.service.spreadsheets().batchUpdate(
+        _execute_sheets_request(self.service.spreadsheets().batchUpdate(
             spreadsheetId=self.sheet_id,
             body=body
-        ).execute()
+        ))
+        self._known_sheets.add(sheet_name)
 
     def clear_sheet(self, sheet_name):
         """
@@ -165,19 +375,53 @@ class GoogleSheetsManager:
         clear_values_request_body = {}
         
         # Clear the sheet contents
-        self.service.spreadsheets().values().clear(
+        _execute_sheets_request(self.service.spreadsheets().values().clear(
             spreadsheetId=self.sheet_id, 
             range=range_, 
             body=clear_values_request_body
-        ).execute()
+        ))
 
     def log_to_sheet(self, data, sheet_name):
         """
-        Logs data to Google Sheet in a specific sheet (tab) without retries.
+        Queues a row for a specific sheet (tab). Rows are appended in batches of
+        SHEETS_BATCH_SIZE, and a background thread writes out partial batches every
+        SHEETS_FLUSH_INTERVAL seconds; call flush() or flush_all() to write any remainder.
         
         :param data: The data to log (as a list of values).
         :param sheet_name: The name of the sheet (tab) to log data into.
         """
+        with self._lock:
+            pending = self._pending.setdefault(sheet_name, [])
+            pending.append(data)
+            batch_full = len(pending) >= SHEETS_BATCH_SIZE
+
+            # Started on first use, so no thread exists yet if the manager is created before forking workers
+            if self._flush_thread is None:
+                self._flush_thread = threading.Thread(target=self._run_periodic_flush, daemon=True)
+                self._flush_thread.start()
+
+        if batch_full:
+            self.flush(sheet_name)
+
+    def _run_periodic_flush(self):
+        while True:
+            time.sleep(SHEETS_FLUSH_INTERVAL)
+            try:
+                self.flush_all()
+            except Exception as e:
+                logger.error(f"Background flush to Google Sheets failed: {e}")
+
+    def flush(self, sheet_name):
+        """
+        Appends all queued rows for a specific sheet (tab) in a single request.
+        
+        :param sheet_name: The name of the sheet (tab) to flush.
+        """
+        with self._lock:
+            values = self._pending.pop(sheet_name, [])
+        if not values:
+            return
+
         # Ensure the sheet exists
         self.create_sheet_if_not_exists(sheet_name)
 
@@ -186,23 +430,31 @@ class GoogleSheetsManager:
         value_input_option = 'RAW'
 
         # Prepare the data to append
-        values = [data]
         body = {'values': values}
 
         try:
             # Append the data to the specific sheet
-            self.service.spreadsheets().values().append(
+            _execute_sheets_request(self.service.spreadsheets().values().append(
                 spreadsheetId=self.sheet_id,
                 range=range_,
                 valueInputOption=value_input_option,
                 insertDataOption="INSERT_ROWS",  # This ensures new data is appended
                 body=body
-            ).execute()
-            logger.info(f"Successfully logged {data} to Google Sheets in sheet {sheet_name}")
+            ))
+            logger.info(f"Successfully logged {len(values)} rows to Google Sheets in sheet {sheet_name}")
         except HttpError as e:
             logger.error(f"Failed to log data to Google Sheets: {e}")
             raise
 
+    def flush_all(self):
+        """
+        Appends the queued rows of every sheet (tab).
+        """
+        with self._lock:
+            sheet_names = list(self._pending)
+        for sheet_name in sheet_names:
+            self.flush(sheet_name)
+
 
     def log_failure(self, user_phone, error_message, sheet_name="Failures"):
         """
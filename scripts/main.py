@@ -1,14 +1,15 @@
 import os
+import atexit
 import logging
-from functools import partial
-from multiprocessing import Manager, Pool, cpu_count
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing import Pool
 from dotenv import load_dotenv
-from user_info_manager import get_customer_info
-from user_worker import generate_the_needful_for_users
-from config_loader import customer_info_sheet, audio_config_path, client_name, customer_info_mapping_path, video_bucket_name, service_account_key_path, google_sheet_id
-from utils import monitor_memory_usage, read_configuration
-from gcs_utils import upload_to_gcs, GoogleSheetsManager
-import json
+from user_info_manager import iter_customer_info, open_workbook
+from user_worker import generate_the_needful_for_users, init_worker, get_artifact_paths, upload_artifacts
+from video import get_background_path
+from config_loader import validate as validate_config, customer_info_sheet, audio_config_path, video_config_path, client_name, customer_info_mapping_path, video_bucket_name, service_account_key_path, google_sheet_id, pool_size, processed_log_path
+from utils import monitor_memory_usage, read_configuration, load_json_file
+from gcs_utils import upload_to_gcs, GoogleSheetsManager, get_storage_client, share_sheets_pacing
 
 # Load environment variables
 load_dotenv()
@@ -17,11 +18,26 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Users whose artifacts the parent uploads at the same time, while the workers keep rendering
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', 4))
+
+def load_processed_users(path):
+    """
+    Reads the keys of users processed by earlier runs from the append-only processed log.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
 def main():
     """
     Main function to orchestrate voiceover generation, video generation, and file uploads.
     """
     try:
+        # Check required client files and create output directories before doing any work
+        validate_config()
+
         # Monitor initial memory usage
         monitor_memory_usage("Initial memory usage")
 
@@ -29,8 +45,7 @@ def main():
         if not os.path.exists(customer_info_mapping_path):
             raise FileNotFoundError(f"Customer info mapping file not found: {customer_info_mapping_path}")
         
-        with open(customer_info_mapping_path, 'r', encoding="utf-8") as f:
-            customer_info_mapping = json.load(f)
+        customer_info_mapping = load_json_file(customer_info_mapping_path)
         
         logger.info(f"Loaded customer info mapping: {customer_info_mapping_path}")
 
@@ -44,18 +59,16 @@ def main():
         if not os.path.exists(customer_info_sheet):
             raise FileNotFoundError(f"Customer info sheet file not found: {customer_info_sheet}")
         
-        user_details = get_customer_info(customer_info_sheet, customer_info_mapping, start_row, end_row)
+        user_details = iter_customer_info(open_workbook(customer_info_sheet), customer_info_mapping, start_row, end_row)
 
         # Load audio config
         audio_config_data = read_configuration(audio_config_path)
         if not audio_config_data:
             raise ValueError(f"Audio config data is invalid or missing: {audio_config_path}")
 
-        # Monitor memory after loading user details
-        monitor_memory_usage("After loading user details")
-
         # Initialize the GoogleSheetsManager
         sheets_manager = GoogleSheetsManager(service_account_key_path, google_sheet_id)
+        atexit.register(sheets_manager.flush_all)  # Write out any rows still buffered at shutdown
 
         # Ensure the client's sheet (tab) exists
         #sheets_manager.create_sheet_if_not_exists(container_specific_tab)
@@ -64,36 +77,76 @@ def main():
         #sheets_manager.clear_sheet(container_specific_tab)
 
         # Use multiprocessing to process users in parallel
-        with Manager() as manager:
-            shared_user_details = manager.list(user_details)  # Shared list of users
-            processed_users = manager.dict()  # Shared dict to track processed users
-            video_details = []
-
-            # Filter out already processed users before passing to the pool
-            unprocessed_user_details = [user for user in shared_user_details if user['key'] not in processed_users]
-
-            # Only proceed if there are unprocessed users
-            if unprocessed_user_details:
-                with Pool(2) as pool:  # Use all available CPU cores
-                    worker_func = partial(generate_the_needful_for_users, 
-                                          audio_config_data=audio_config_data, 
-                                          customer_info_mapping=customer_info_mapping,
-                                          sheets_manager=sheets_manager,
-                                          container_specific_tab=container_specific_tab,
-                                          processed_users=processed_users)
-
-                    # Use map to block until all users are processed
-                    results = pool.map(worker_func, unprocessed_user_details)
-
-                    # Handle results, e.g., append valid video details to the list
-                    for res in results:
-                        if res:  # If a valid result was returned
+        processed_users = load_processed_users(processed_log_path)  # Keys of processed users, including earlier runs
+        logger.info(f"Loaded {len(processed_users)} processed users from {processed_log_path}")
+        video_details = []
+
+        # Index users by key as the sheet rows stream in, leaving out already processed users;
+        # a key repeated in the sheet is only processed once, since it maps to the same output files
+        users_by_key = {user['key']: user for user in user_details if user['key'] not in processed_users}
+        unprocessed_user_details = list(users_by_key.values())
+
+        # Order users by background template: consecutive users land in the same pool chunk,
+        # so a worker renders its chunk over one template file, which stays hot in the page cache
+        # (sheet order is kept when the video config has no backgrounds to sort by)
+        try:
+            video_config = read_configuration(video_config_path)
+            if video_config and video_config.get('backgrounds'):
+                unprocessed_user_details.sort(key=lambda user: get_background_path(video_config, user['mapping_data']))
+        except Exception as e:
+            logger.warning(f"Keeping sheet order, could not sort users by background: {e}")
+
+        # Monitor memory after loading user details
+        monitor_memory_usage("After loading user details")
+
+        # Work out every user's output paths once, up front, and share them with the workers
+        user_artifact_map = {user['key']: get_artifact_paths(user['key']) for user in unprocessed_user_details}
+
+        # Only proceed if there are unprocessed users
+        if unprocessed_user_details:
+            # Hand each worker a few chunks so dispatch is amortized but a slow user can't stall a big batch
+            chunksize = max(1, len(unprocessed_user_details) // (pool_size * 4))
+
+            # Each worker authenticates its own Sheets/Text-to-Speech clients and receives the configs once, in init_worker,
+            # along with the Sheets pacing state they share with this process, so the API rate limit covers the whole pool
+            init_args = (service_account_key_path, google_sheet_id, audio_config_data, customer_info_mapping, container_specific_tab, user_artifact_map, share_sheets_pacing())
+            # Results all arrive in this process, so it alone uploads the artifacts and appends to the
+            # processed log; line buffering keeps the log crash-safe
+            with Pool(pool_size, initializer=init_worker, initargs=init_args) as pool, \
+                    ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as upload_executor, \
+                    open(processed_log_path, 'a', buffering=1) as processed_log:
+                # Create the shared storage client once, before the upload threads need it
+                get_storage_client()
+                pending_uploads = {}
+
+                def record_uploads(done):
+                    # Only users whose artifacts reached GCS are logged, so a failed upload is retried next run
+                    for future in done:
+                        res = pending_uploads.pop(future)
+                        if future.result():
                             video_details.append(res)
+                            processed_users.add(res['key'])
+                            processed_log.write(f"{res['key']}\n")
                         else:
-                            logger.error("Failed to process a user")
+                            logger.error(f"Failed to upload the artifacts of user {res['key']}")
+
+                # Handle results as each user completes: its uploads run here while the workers render the next users
+                for res in pool.imap_unordered(generate_the_needful_for_users, unprocessed_user_details, chunksize=chunksize):
+                    if res:  # If a valid result was returned
+                        pending_uploads[upload_executor.submit(upload_artifacts, res)] = res
+                    else:
+                        logger.error("Failed to process a user")
+                    record_uploads([future for future in pending_uploads if future.done()])
+
+                # Let workers exit cleanly so they flush their buffered Sheets rows
+                pool.close()
+                pool.join()
+
+                # Wait for the remaining uploads before the log is closed
+                record_uploads(wait(pending_uploads).done)
 
-        # Free memory by deleting user_details and shared_user_details after processing
-        del user_details, shared_user_details
+        # Free memory by deleting the user details after processing
+        del users_by_key
         monitor_memory_usage("After processing all users")
 
         logger.info("Process completed for all users. The END.")
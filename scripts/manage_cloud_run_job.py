@@ -1,8 +1,18 @@
+import os
+import shutil
 import subprocess
 import time
 import json
-import yaml
 import argparse
+import configparser
+import datetime
+from google.api_core.exceptions import GoogleAPICallError
+from google.cloud import run_v2
+from google.oauth2.credentials import Credentials
+from google.protobuf import duration_pb2
+
+# Resolve the gcloud executable once; commands are run directly, without a shell
+GCLOUD = shutil.which('gcloud') or 'gcloud'
 
 def build_and_push_image(image_name, tag='latest'):
     """
@@ -26,66 +36,80 @@ def build_and_push_image(image_name, tag='latest'):
         raise
 
 
-def load_job_yaml(job_name, region, yaml_file='job.yaml'):
+def _gcloud_access_token(request, scopes):
     """
-    Load the existing job YAML by exporting it from Cloud Run.
-    
-    :param job_name: Name of the Cloud Run job.
-    :param region: Region where the job is deployed.
-    :param yaml_file: Path to the YAML file to save.
+    Refresh handler returning the gcloud CLI's current access token and its expiry, so the
+    API clients act as the account `gcloud auth login` set up.
     """
-    print(f"Exporting Cloud Run job {job_name} to YAML")
-    with open(yaml_file, 'w') as file:
-        subprocess.run(['gcloud', 'run', 'jobs', 'describe', job_name, '--region', region, '--format', 'yaml'], check=True, shell=True, stdout=file)
+    result = subprocess.run([GCLOUD, 'config', 'config-helper', '--format=json'], check=True, capture_output=True, text=True)
+    credential = json.loads(result.stdout)['credential']
+    expiry = datetime.datetime.strptime(credential['token_expiry'], '%Y-%m-%dT%H:%M:%SZ')
+    return credential['access_token'], expiry
 
-def modify_job_yaml(yaml_file, task_configs, image_name):
+def get_gcloud_credentials():
     """
-    Modify the job YAML file to update task count and container configurations.
+    Returns credentials backed by the gcloud CLI login, refreshed through gcloud as they expire.
+    The clients would otherwise look for Application Default Credentials, which
+    `gcloud auth login` (see auth_and_setup) doesn't set up.
     """
-    with open(yaml_file, 'r') as file:
-        job_config = yaml.safe_load(file)
+    return Credentials(token=None, refresh_handler=_gcloud_access_token)
+
+# Jobs client reused across calls
+_jobs_client = None
+
+def get_jobs_client():
+    """
+    Returns the Cloud Run jobs client, creating it on first use.
+    """
+    global _jobs_client
+    if _jobs_client is None:
+        _jobs_client = run_v2.JobsClient(credentials=get_gcloud_credentials())
+    return _jobs_client
+
+def update_cloud_run_job(job_name, project_id, region, task_configs, image_name):
+    """
+    Update the Cloud Run job's task count and container configurations in place.
+    
+    :param job_name: Name of the Cloud Run job.
+    :param project_id: The Google Cloud project ID.
+    :param region: Region where the job is deployed.
+    :param task_configs: List of task configurations, each with 'start_row' and 'end_row'.
+    :param image_name: Name of the image the containers run.
+    """
+    client = get_jobs_client()
+    job = client.get_job(name=client.job_path(project_id, region, job_name))
 
     # Set the task count
-    job_config['spec']['template']['spec']['taskCount'] = len(task_configs)
+    job.template.task_count = len(task_configs)
 
     # Set maxRetries under the task-level configuration
-    job_config['spec']['template']['spec']['template']['spec']['maxRetries'] = 0
+    job.template.template.max_retries = 0
 
-    # Set the task timeout to 10800 seconds (180 minutes)
-    job_config['spec']['template']['spec']['template']['spec']['timeoutSeconds'] = 3600
+    # Set the task timeout to 3600 seconds (60 minutes)
+    job.template.template.timeout = duration_pb2.Duration(seconds=3600)
 
     # Configure containers
-    job_config['spec']['template']['spec']['template']['spec']['containers'] = []
-    for idx, task_config in enumerate(task_configs):
-        job_config['spec']['template']['spec']['template']['spec']['containers'].append({
-            'name': f'generate-marketing-videos-{idx+1}',
-            'image': f'{image_name}:latest',
-            'env': [
-                {'name': 'START_ROW', 'value': str(task_config['start_row'])},
-                {'name': 'END_ROW', 'value': str(task_config['end_row'])}
+    job.template.template.containers = [
+        run_v2.Container(
+            name=f'generate-marketing-videos-{idx+1}',
+            image=f'{image_name}:latest',
+            env=[
+                run_v2.EnvVar(name='START_ROW', value=str(task_config['start_row'])),
+                run_v2.EnvVar(name='END_ROW', value=str(task_config['end_row']))
             ],
-            'resources': {
-                'limits': {
+            resources=run_v2.ResourceRequirements(
+                limits={
                     'cpu': '2',
                     'memory': '8Gi'
                 }
-            }
-        })
-
-    with open(yaml_file, 'w') as file:
-        yaml.safe_dump(job_config, file)
+            )
+        )
+        for idx, task_config in enumerate(task_configs)
+    ]
 
-    print(f"Updated YAML content:\n{yaml.safe_dump(job_config)}")
-
-def update_cloud_run_job_with_yaml(yaml_file, region):
-    """
-    Update the Cloud Run job using the modified YAML file.
-    
-    :param yaml_file: Path to the job YAML file.
-    :param region: Region where the job is deployed.
-    """
-    print(f"Updating Cloud Run job using YAML: {yaml_file}")
-    subprocess.run(['gcloud', 'run', 'jobs', 'replace', yaml_file, '--region', region], check=True, shell=True)
+    print(f"Updating Cloud Run job {job_name}")
+    updated_job = client.update_job(job=job).result()
+    print(f"Updated job template:\n{updated_job.template}")
 
 def execute_cloud_run_job(job_name, region='us-central1'):
     """
@@ -99,10 +123,10 @@ def execute_cloud_run_job(job_name, region='us-central1'):
         # Execute the Cloud Run job
         print(f"Executing Cloud Run job: {job_name}")
         result = subprocess.run([
-            'gcloud', 'run', 'jobs', 'execute', job_name,
+            GCLOUD, 'run', 'jobs', 'execute', job_name,
             '--region', region,
             '--format=json'  # Capture execution details in JSON
-        ], check=True, capture_output=True, text=True, shell=True)
+        ], check=True, capture_output=True, text=True)
 
         # Parse the JSON output to get the execution name
         job_execution = json.loads(result.stdout)
@@ -123,29 +147,55 @@ import subprocess
 import json
 import time
 
-def monitor_job_progress(execution_name, region='us-central1'):
+# Executions client reused across polls
+_executions_client = None
+
+def get_executions_client():
+    """
+    Returns the Cloud Run executions client, creating it on first use.
+    """
+    global _executions_client
+    if _executions_client is None:
+        _executions_client = run_v2.ExecutionsClient(credentials=get_gcloud_credentials())
+    return _executions_client
+
+def get_execution_status(execution):
+    """
+    Derives the overall status of a Cloud Run job execution from its task counts.
+    
+    :param execution: The run_v2 Execution to inspect.
+    :return: One of "RUNNING", "CANCELLED", "FAILED" or "SUCCEEDED".
+    """
+    if not execution.completion_time:
+        return "RUNNING"
+    if execution.cancelled_count:
+        return "CANCELLED"
+    if execution.failed_count:
+        return "FAILED"
+    return "SUCCEEDED"
+
+def monitor_job_progress(execution_name, project_id, job_name, region='us-central1'):
     """
     Monitor the Cloud Run job execution status for a specific execution.
     
     :param execution_name: Name of the Cloud Run job execution to monitor.
+    :param project_id: The Google Cloud project ID.
+    :param job_name: Name of the Cloud Run job the execution belongs to.
     :param region: Region where the Cloud Run job is deployed.
     """
     try:
         print(f"Monitoring Cloud Run job execution {execution_name} for progress...")
+        client = get_executions_client()
+        execution_path = client.execution_path(project_id, region, job_name, execution_name)
         while True:
             try:
-                # Fetch execution details using gcloud command
-                result = subprocess.run(
-                    ['gcloud', 'run', 'jobs', 'executions', 'describe', execution_name,
-                     '--region', region, '--format=json'],
-                    check=True, capture_output=True, text=True, shell=True
-                )
-                execution_info = json.loads(result.stdout)
+                # Fetch execution details from the Cloud Run Admin API
+                execution = client.get_execution(name=execution_path)
 
                 # Extract status and time details
-                completion_status = execution_info.get('status', {}).get('state', 'Unknown')
-                start_time = execution_info.get('startTime', 'N/A')
-                completion_time = execution_info.get('completionTime', 'N/A')
+                completion_status = get_execution_status(execution)
+                start_time = execution.start_time or 'N/A'
+                completion_time = execution.completion_time or 'N/A'
 
                 # Log the current status
                 print(f"Execution started at {start_time}. Status: {completion_status}")
@@ -158,15 +208,9 @@ def monitor_job_progress(execution_name, region='us-central1'):
                     print(f"Job execution failed or cancelled at {completion_time}. Status: {completion_status}")
                     return
 
-            except subprocess.CalledProcessError as e:
-                # Capture error from gcloud command execution
-                print(f"Error during gcloud command execution: {e}")
-                print(f"Command output: {e.output}")
-                print(f"Command stderr: {e.stderr}")
-
-            except json.JSONDecodeError as e:
-                print(f"Error parsing JSON output: {e}")
-                print(f"Raw output: {result.stdout}")
+            except GoogleAPICallError as e:
+                # Capture error from the Cloud Run Admin API
+                print(f"Error fetching execution details: {e}")
             
             # Wait for a while before polling again
             time.sleep(10)
@@ -178,6 +222,26 @@ def monitor_job_progress(execution_name, region='us-central1'):
 import subprocess
 import json
 
+def read_active_gcloud_config():
+    """
+    Reads the properties of the active gcloud configuration straight from its file.
+    
+    :return: A ConfigParser with the configuration's sections (e.g. core, run); empty if none is found.
+    """
+    config_dir = os.getenv('CLOUDSDK_CONFIG', os.path.expanduser(os.path.join('~', '.config', 'gcloud')))
+    config_name = os.getenv('CLOUDSDK_ACTIVE_CONFIG_NAME')
+
+    if not config_name:
+        try:
+            with open(os.path.join(config_dir, 'active_config'), 'r') as file:
+                config_name = file.read().strip()
+        except FileNotFoundError:
+            config_name = 'default'
+
+    gcloud_config = configparser.ConfigParser()
+    gcloud_config.read(os.path.join(config_dir, 'configurations', f'config_{config_name or "default"}'))
+    return gcloud_config
+
 def auth_and_setup(project_id, region):
     """
     Authenticate and set up the environment for Google Cloud Run operations.
@@ -187,42 +251,35 @@ def auth_and_setup(project_id, region):
     """
     try:
         # Check if the user is already authenticated
-        auth_check = subprocess.run(['gcloud', 'auth', 'list', '--format=json'], capture_output=True, text=True, shell=True)
+        auth_check = subprocess.run([GCLOUD, 'auth', 'list', '--format=json'], capture_output=True, text=True)
 
         if auth_check.returncode != 0 or not auth_check.stdout.strip():
             print("Failed to retrieve authentication status. Attempting to log in.")
-            subprocess.run(['gcloud', 'auth', 'login'], check=True, shell=True)
+            subprocess.run([GCLOUD, 'auth', 'login'], check=True)
         else:
             auth_data = json.loads(auth_check.stdout)
 
             # If no active accounts, trigger login
             if not auth_data or not any(acct.get('status') == 'ACTIVE' for acct in auth_data):
                 print("No active authentication found. Logging in...")
-                subprocess.run(['gcloud', 'auth', 'login'], check=True, shell=True)
+                subprocess.run([GCLOUD, 'auth', 'login'], check=True)
 
-        # Check if the correct project is already set
-        project_check = subprocess.run(['gcloud', 'config', 'get-value', 'project'], capture_output=True, text=True, shell=True)
-        current_project = project_check.stdout.strip()
+        # Read the active gcloud configuration once instead of running `gcloud config get-value` per setting
+        gcloud_config = read_active_gcloud_config()
 
-        if project_check.returncode != 0 or not current_project:
-            print("Failed to retrieve project configuration.")
-            raise subprocess.CalledProcessError(project_check.returncode, project_check.args)
+        # Check if the correct project is already set
+        current_project = gcloud_config.get('core', 'project', fallback='').strip()
 
         if current_project != project_id:
             print(f"Setting project to {project_id}...")
-            subprocess.run(['gcloud', 'config', 'set', 'project', project_id], check=True, shell=True)
+            subprocess.run([GCLOUD, 'config', 'set', 'project', project_id], check=True)
 
         # Check if the correct region is already set
-        region_check = subprocess.run(['gcloud', 'config', 'get-value', 'run/region'], capture_output=True, text=True, shell=True)
-        current_region = region_check.stdout.strip()
-
-        if region_check.returncode != 0 or not current_region:
-            print("Failed to retrieve region configuration.")
-            raise subprocess.CalledProcessError(region_check.returncode, region_check.args)
+        current_region = gcloud_config.get('run', 'region', fallback='').strip()
 
         if current_region != region:
             print(f"Setting region to {region}...")
-            subprocess.run(['gcloud', 'config', 'set', 'run/region', region], check=True, shell=True)
+            subprocess.run([GCLOUD, 'config', 'set', 'run/region', region], check=True)
 
         # Ensure required services are enabled for Cloud Run
         required_services = [
@@ -250,8 +307,8 @@ def enable_service_if_needed(service_name, project_id):
     try:
         # Check if the service is already enabled
         check_service = subprocess.run(
-            ['gcloud', 'services', 'list', '--enabled', '--format=json', '--project', project_id],
-            capture_output=True, text=True, shell=True
+            [GCLOUD, 'services', 'list', '--enabled', '--format=json', '--project', project_id],
+            capture_output=True, text=True
         )
 
         if check_service.returncode != 0 or not check_service.stdout.strip():
@@ -262,7 +319,7 @@ def enable_service_if_needed(service_name, project_id):
         
         if not any(service['config']['name'] == service_name for service in enabled_services):
             print(f"Enabling service: {service_name}")
-            subprocess.run(['gcloud', 'services', 'enable', service_name, '--project', project_id], check=True, shell=True)
+            subprocess.run([GCLOUD, 'services', 'enable', service_name, '--project', project_id], check=True)
 
     except subprocess.CalledProcessError as e:
         print(f"Error enabling service {service_name}: {e}")
@@ -271,7 +328,7 @@ def enable_service_if_needed(service_name, project_id):
 def main():
     parser = argparse.ArgumentParser(description="Manage Cloud Run job lifecycle.")
     parser.add_argument('--build', action='store_true', help="Build and push the Docker image.")
-    parser.add_argument('--update', action='store_true', help="Update the Cloud Run job using YAML.")
+    parser.add_argument('--update', action='store_true', help="Update the Cloud Run job's tasks and containers.")
     parser.add_argument('--execute', action='store_true', help="Execute the Cloud Run job.")
     parser.add_argument('--monitor', action='store_true', help="Monitor the Cloud Run job execution.")
     parser.add_argument('--auth', action='store_true', help="Authenticate and set up the environment.")
@@ -284,7 +341,6 @@ def main():
     tag = 'latest'
     job_name = 'generate-marketing-videos'
     region = 'us-central1'
-    yaml_file = 'job.yaml'
 
     # Define task configurations (multiple containers)
     task_configs = [
@@ -300,11 +356,9 @@ def main():
     if args.build:
         build_and_push_image(image_name, tag)
 
-    # Step 2: Export the current Cloud Run job to a YAML file and update it
+    # Step 2: Update the Cloud Run job's task count and containers
     if args.update:
-        load_job_yaml(job_name, region, yaml_file)
-        modify_job_yaml(yaml_file, task_configs, image_name)
-        update_cloud_run_job_with_yaml(yaml_file, region)
+        update_cloud_run_job(job_name, project_id, region, task_configs, image_name)
 
     # Step 3: Execute the updated Cloud Run job
     if args.execute:
@@ -312,7 +366,7 @@ def main():
 
     # Step 4: Monitor the job's progress
     if args.monitor and execution_name:
-        monitor_job_progress(execution_name, region)
+        monitor_job_progress(execution_name, project_id, job_name, region)
 
 if __name__ == "__main__":
     main()
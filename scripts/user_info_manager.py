@@ -1,101 +1,160 @@
 import logging
 import os
 import re
+from functools import lru_cache
 from utils import monitor_memory_usage
+import numpy as np
 import pandas as pd
 
+# Read workbooks with the Rust-based calamine parser when python-calamine is installed
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# Processing types whose columns hold free text
+TEXT_PROCESSING_TYPES = {'name', 'name_respect'}
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_customer_info(customer_info_sheet, customer_info_mapping, start_row, end_row):
+@lru_cache(maxsize=8)
+def _find_primary_field_cached(primary_flags):
+    primary_field = None
+
+    # Iterate over the fields in the data
+    for field, is_primary in primary_flags:
+        # Check if "IsPrimary" is set to True
+        if is_primary == "True":  # Using string since JSON is often loaded with string values
+            if primary_field is not None:
+                # If we already found a primary field, raise an error
+                raise ValueError(f"Multiple primary fields detected: '{primary_field}' and '{field}'")
+            primary_field = field
+
+    if primary_field is None:
+        raise ValueError("No primary field found.")
+
+    return primary_field
+
+def find_primary_field(customer_info_mapping):
     """
-    Reads customer information from an Excel sheet and processes it based on the mapping configuration.
+    Reads the mapping to identify the primary field name. The result is memoized
+    on the fields' IsPrimary flags, so repeated calls with the same mapping are free.
+    """
+    primary_flags = tuple((field, attributes.get("IsPrimary")) for field, attributes in customer_info_mapping.items())
+    return _find_primary_field_cached(primary_flags)
+
+@lru_cache(maxsize=4)
+def _open_workbook_cached(path, mtime):
+    return pd.ExcelFile(path, engine=EXCEL_ENGINE)
+
+def open_workbook(path):
+    """
+    Opens an Excel workbook once per process and returns the cached handle on later calls.
+    The handle is reopened if the file has been modified since.
     
     Args:
-        customer_info_sheet (str): Path to the Excel file containing customer information.
-        customer_info_mapping (dict): Mapping configuration for the fields in the Excel sheet.
+        path (str): Path to the Excel file.
     
     Returns:
-        list: A list of dictionaries, each containing 'phone_number' and 'mapping_data'.
+        pd.ExcelFile: The opened workbook.
     """
-    try:      
-        #Read the mapping sheet to identify primary field name
-        def find_primary_field(data):
-            primary_field = None
-    
-            # Iterate over the fields in the data
-            for field, attributes in data.items():
-                # Check if "IsPrimary" is set to True
-                if attributes.get("IsPrimary") == "True":  # Using string since JSON is often loaded with string values
-                    if primary_field is not None:
-                        # If we already found a primary field, raise an error
-                        raise ValueError(f"Multiple primary fields detected: '{primary_field}' and '{field}'")
-                    primary_field = field
+    return _open_workbook_cached(path, os.path.getmtime(path))
+
+def iter_customer_info(workbook, customer_info_mapping, start_row, end_row):
+    """
+    Reads customer information from an Excel sheet and processes it based on the mapping configuration.
+    Users are yielded one at a time as their rows are processed, rather than collected into a list.
     
-            if primary_field is None:
-                raise ValueError("No primary field found.")
+    Args:
+        workbook (pd.ExcelFile): Workbook containing customer information, as returned by open_workbook.
+        customer_info_mapping (dict): Mapping configuration for the fields in the Excel sheet.
+        start_row (int): First data row to read.
+        end_row (int): Last data row to read.
     
-            return primary_field
-
+    Yields:
+        dict: A dictionary per user, containing 'key' and 'mapping_data'.
+    """
+    try:      
         # Load the Excel file
         primary_field = find_primary_field(customer_info_mapping)
 
+        # Only parse the columns the mapping uses, and read free-text ones as strings without type inference
+        needed_columns = {mapping.get('column_name') for mapping in customer_info_mapping.values()}
+        needed_columns.add(primary_field)
+        dtypes = {
+            mapping['column_name']: str
+            for mapping in customer_info_mapping.values()
+            if TEXT_PROCESSING_TYPES & {mapping.get('audio_processing'), mapping.get('video_processing')}
+        }
+
         try:
-            df = pd.read_excel(customer_info_sheet, skiprows=range(1,start_row), nrows=end_row-start_row + 1)
+            df = workbook.parse(
+                sheet_name=0,
+                skiprows=range(1,start_row),
+                nrows=end_row-start_row + 1,
+                usecols=lambda column: column in needed_columns,
+                dtype=dtypes
+            )
         except FileNotFoundError as e:
             logger.error(f"File not found: {e}")
         except KeyError as e:
             logger.error(f"Missing key in Excel file: {e}")
 
         if df.empty:
-            raise ValueError(f"Excel file {customer_info_sheet} is empty or invalid.")
+            raise ValueError(f"Excel file {workbook.io} is empty or invalid.")
         
-        user_details = []
-              
         # Check if the primary field exists in the data
         if primary_field not in df.columns:
             raise KeyError(f"Phone number column '{primary_field}' not found in the Excel sheet.")
 
+        # Pull the mapped columns out once as a single object array (keeping native Python values)
+        # together with a vectorized not-missing mask, instead of checking cell by cell
+        elements = []
+        column_names = []
+        for element, mapping in customer_info_mapping.items():
+            column_name = mapping.get('column_name')
+
+            if column_name not in df.columns:
+                logger.warning(f"Column '{column_name}' for field '{element}' not found in the Excel sheet. Skipping this field.")
+                continue  # Skip missing fields
+
+            elements.append(element)
+            column_names.append(column_name)
+
+        mapped = df[column_names]
+        values = mapped.to_numpy(dtype=object)
+        present = mapped.notna().to_numpy()
+        del mapped
+
+        primary_values = df[primary_field].to_numpy(dtype=object)
+
         # Iterate through each row and process the data
-        for index, row in df.iterrows():
-            mapping_data = {}
-            
-            for element, mapping in customer_info_mapping.items():
-                column_name = mapping.get('column_name')
-                
+        for i, index in enumerate(df.index):
+            row_values = values[i]
+            row_present = present[i]
+            mapping_data = {elements[j]: row_values[j] for j in np.flatnonzero(row_present)}
 
-                if column_name not in df.columns:
-                    logger.warning(f"Column '{column_name}' for field '{element}' not found in row {index}. Skipping this field.")
-                    continue  # Skip missing fields
-                
-                value = row.get(column_name)
-                if pd.isna(value):
-                    logger.warning(f"Missing value for column '{column_name}' in row {index}. Skipping this field.")
-                    continue
-                
-                mapping_data[element] = value
+            if len(mapping_data) < len(elements):
+                for j in np.flatnonzero(~row_present):
+                    logger.warning(f"Missing value for column '{column_names[j]}' in row {index}. Skipping this field.")
                 
             # Retrieve and clean phone number
             #phone_number = re.sub(r'\D', '', str(row.get(phone_number_column_name, None)))
-            primary_value= str(row.get(primary_field, None))
+            primary_value= str(primary_values[i])
             if not primary_value:
                 logger.warning(f"Primary key missing or invalid for row {index}. Skipping this row.")
                 continue  # Skip rows with missing/invalid phone numbers
 
-            user_details.append({
+            yield {
                 'key': primary_value,
                 'mapping_data': mapping_data,
-            })
+            }
             logger.info(f"Processed user details for: {primary_value}")
         
-        # Release the DataFrame memory once it's no longer needed
-        del df
-        
         #monitor_memory_usage("After reading user details")
-        
-        return user_details
 
     except Exception as e:
         logger.exception(f"Error in processing customer info: {e}")
-        return []
@@ -1,131 +1,167 @@
 import logging
 import os
-from voiceover import generate_voiceover_script, generate_audio_files
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.util import Finalize
+from voiceover import generate_voiceover_script, generate_audio_files, get_tts_client
 from video import generate_video
-from gcs_utils import upload_to_gcs, GoogleSheetsManager
+from gcs_utils import upload_to_gcs, gcs_url, GoogleSheetsManager, use_sheets_pacing
 from config_loader import video_config_path, videos_dir, cover_images_dir, cover_image_bucket_name, video_bucket_name, service_account_key_path, google_sheet_id, client_name
-from utils import monitor_memory_usage, read_configuration
+from utils import monitor_memory_usage, read_configuration, process_customer_data_for_modes
 import time
 import multiprocessing
 
 logger = logging.getLogger(__name__)
 
-def generate_the_needful_for_users(user_details, audio_config_data, customer_info_mapping, sheets_manager, container_specific_tab, processed_users):
-    video_details = {}
-    #lock = multiprocessing.Lock()
-
-    user_key = user_details['key']
+# Per-process state, set up once by init_worker
+_sheets_manager = None
+_audio_config_data = None
+_customer_info_mapping = None
+_container_specific_tab = None
+_user_artifact_map = {}
+
+def get_artifact_paths(user_key):
+    """
+    Returns the local output paths of a user's video and cover image.
+    """
+    video_filename = f"{user_key}.mp4"
+    return {
+        'video': os.path.join(videos_dir, video_filename),
+        'cover_image': os.path.join(cover_images_dir, video_filename.replace(".mp4", ".jpg"))
+    }
 
-    # Step 0: Check if this user has already been processed
-    if user_key in processed_users:
-        logger.info(f"Skipping user {user_key}, already processed.")
-        return None
+def upload_artifacts(video_details):
+    """
+    Uploads a processed user's cover image and video to GCS, logging (rather than raising)
+    any failure. The parent process runs this on its own threads, so a worker can render the
+    next user while the previous user's files upload.
+    
+    :param video_details: Details returned by generate_the_needful_for_users for the user.
+    :return: True if every upload succeeded, False otherwise.
+    """
+    user_key = video_details['key']
+    uploads = [(cover_image_bucket_name, video_details['cover_image_path']), (video_bucket_name, video_details['video_path'])]
+    uploaded = True
+    # Upload the files concurrently over the shared storage client
+    with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+        futures = {
+            executor.submit(upload_to_gcs, bucket_name, file_path): file_path
+            for bucket_name, file_path in uploads
+        }
+        for future, file_path in futures.items():
+            try:
+                url = future.result()
+                logger.info(f"Uploaded {file_path} to GCS at {url}")
+            except Exception as e:
+                logger.error(f"Upload of {file_path} failed for user {user_key}: {e}")
+                #_sheets_manager.log_failure(user_key, f"Upload failure: {str(e)}", sheet_name="Failures")
+                uploaded = False
+    return uploaded
+
+def init_worker(service_account_key_path, google_sheet_id, audio_config_data, customer_info_mapping, container_specific_tab, user_artifact_map, sheets_pacing):
+    """
+    Pool initializer: authenticates the Sheets and Text-to-Speech clients once per
+    worker process so that tasks reuse them instead of setting them up again, and keeps
+    the shared configs and precomputed artifact paths in module globals so they aren't
+    sent along with every task. Backgrounds are opened on demand by the tasks.
+    Sheets calls are paced with the parent's shared state, so the request rate limit
+    holds for the whole pool rather than for each worker.
+    """
+    global _sheets_manager, _audio_config_data, _customer_info_mapping, _container_specific_tab, _user_artifact_map
+    _audio_config_data = audio_config_data
+    _customer_info_mapping = customer_info_mapping
+    _container_specific_tab = container_specific_tab
+    _user_artifact_map = user_artifact_map
+
+    # Make sure the output directories exist once per process instead of checking for every user;
+    # this runs after the parent's validate_config, so bad settings are reported there first
+    os.makedirs(videos_dir, exist_ok=True)
+    os.makedirs(cover_images_dir, exist_ok=True)
+
+    use_sheets_pacing(sheets_pacing)
+    _sheets_manager = GoogleSheetsManager(service_account_key_path, google_sheet_id)
+    get_tts_client()
+
+    # Write out rows still buffered in this worker when it exits
+    Finalize(_sheets_manager, _sheets_manager.flush_all, exitpriority=10)
+
+def generate_the_needful_for_users(user_details):
+    video_details = {}
 
     # Step 1: Read video configuration
     try:
         video_config = read_configuration(video_config_path)
     except Exception as e:
         logger.error(f"Error reading video configuration for user {user_details['key']}: {e}")
-        #sheets_manager.log_failure(user_details['key'], f"Video config read failure: {str(e)}", sheet_name="Failures")
+        #_sheets_manager.log_failure(user_details['key'], f"Video config read failure: {str(e)}", sheet_name="Failures")
         return video_details
 
-    # Step 2: Generate the voiceover script
+    # Step 2: Generate the voiceover script, processing the customer data for the voiceover and the video in one pass
     try:
-        audio_segments = generate_voiceover_script(user_details, customer_info_mapping, video_config.get("audio_segments"))
+        processed_customer_data = process_customer_data_for_modes(user_details['mapping_data'], _customer_info_mapping, ("audio_processing", "video_processing"))
+        audio_segments = generate_voiceover_script(user_details, _customer_info_mapping, video_config.get("audio_segments"), processed_customer_data["audio_processing"])
         if not audio_segments:
             raise ValueError("Voiceover script generation failed")
     except Exception as e:
         logger.error(f"Voiceover script generation failed for user {user_details['key']}: {e}")
-        #sheets_manager.log_failure(user_details['key'], f"Voiceover script failure: {str(e)}", sheet_name="Failures")
+        #_sheets_manager.log_failure(user_details['key'], f"Voiceover script failure: {str(e)}", sheet_name="Failures")
         return video_details
 
     # Step 3: Generate the audio file (with time marks)
     try:
-        audio_files, synthesis_time = generate_audio_files(audio_segments, audio_config_data, user_details)
+        audio_files, synthesis_time = generate_audio_files(audio_segments, _audio_config_data, user_details)
         if not audio_files:
             raise ValueError("Audio file generation failed")
     except Exception as e:
         logger.error(f"Audio file generation failed for user {user_details['key']}: {e}")
-        #sheets_manager.log_failure(user_details['key'], f"Audio file generation failure: {str(e)}", sheet_name="Failures")
+        #_sheets_manager.log_failure(user_details['key'], f"Audio file generation failure: {str(e)}", sheet_name="Failures")
         return video_details
 
     # Memory Profiling
     monitor_memory_usage(f"After generating audio for {user_details['key']}")
                  
-    # Step 4: Ensure the output directories exist for videos and cover images
-    try:
-        if not os.path.exists(videos_dir):
-            os.makedirs(videos_dir, exist_ok=True)
-
-        if not os.path.exists(cover_images_dir):
-            os.makedirs(cover_images_dir, exist_ok=True)
-    except Exception as e:
-        logger.error(f"Directory creation failed for user {user_details['key']}: {e}")
-        #sheets_manager.log_failure(user_details['key'], f"Directory creation failure: {str(e)}", sheet_name="Failures")
-        return video_details
-
-    # Step 5: Generate video based on time marks and voiceover path
-    video_filename = f"{user_details['key']}.mp4"
-    output_path = os.path.join(videos_dir, video_filename)
-    image_path = os.path.join(cover_images_dir, video_filename.replace(".mp4", ".jpg"))
+    # Step 4: Generate video based on time marks and voiceover path
+    artifact_paths = _user_artifact_map.get(user_details['key']) or get_artifact_paths(user_details['key'])
+    output_path = artifact_paths['video']
+    image_path = artifact_paths['cover_image']
 
     try:
-        video_duration = generate_video(user_details, video_config, customer_info_mapping, audio_files, output_path, image_path)
+        video_duration = generate_video(user_details, video_config, _customer_info_mapping, audio_files, output_path, image_path, processed_customer_data["video_processing"])
         if not video_duration:
             raise ValueError("Video generation failed")
     except Exception as e:
         logger.error(f"Video generation failed for user {user_details['key']}: {e}")
-        #sheets_manager.log_failure(user_details['key'], f"Video generation failure: {str(e)}", sheet_name="Failures")
+        #_sheets_manager.log_failure(user_details['key'], f"Video generation failure: {str(e)}", sheet_name="Failures")
         return video_details
 
     # Memory Profiling after video generation
     monitor_memory_usage(f"After generating video for {user_details['key']}")
 
-    # Step 6: Upload the cover image to GCS
-    try:
-        cover_image_gcs_url = upload_to_gcs(cover_image_bucket_name, image_path)
-        if not cover_image_gcs_url:
-            raise ValueError("Cover image upload failed")
-        logger.info(f"Cover image uploaded to GCS at {cover_image_gcs_url}")
-    except Exception as e:
-        logger.error(f"Cover image upload failed for user {user_details['key']}: {e}")
-        #sheets_manager.log_failure(user_details['key'], f"Cover image upload failure: {str(e)}", sheet_name="Failures")
-        return video_details
-
-    # Step 7: Upload the video to GCS
-    try:
-        video_gcs_url = upload_to_gcs(video_bucket_name, output_path)
-        if not video_gcs_url:
-            raise ValueError("Video upload failed")
-        logger.info(f"Video uploaded to GCS at {video_gcs_url}")
-    except Exception as e:
-        logger.error(f"Video upload failed for user {user_details['key']}: {e}")
-        #sheets_manager.log_failure(user_details['key'], f"Video upload failure: {str(e)}", sheet_name="Failures")
-        return video_details
+    # Step 5: The cover image and the video are uploaded to GCS by the parent process (see
+    # upload_artifacts), which marks the user as processed only once both uploads succeed
+    cover_image_gcs_url = gcs_url(cover_image_bucket_name, image_path)
+    video_gcs_url = gcs_url(video_bucket_name, output_path)
 
-    # Step 8: Log successful operations to Google Sheets
+    # Step 6: Log successful operations to Google Sheets
+    # Rows are buffered and appended in batches by the manager, so no lock or delay is needed here
     #try:
-    #    with lock:
-    #        sheets_manager.log_to_sheet([
-    #            user_details['key'], video_gcs_url, cover_image_gcs_url, video_duration
-    #        ], container_specific_tab)
-    #        #logger.info(f"Successfully logged {user_details['key']} to Google Sheets")
-    #    time.sleep(1)  # Delay to avoid potential write conflicts
+    #    _sheets_manager.log_to_sheet([
+    #        user_details['key'], video_gcs_url, cover_image_gcs_url, video_duration
+    #    ], _container_specific_tab)
     #except Exception as e:
     #    logger.error(f"Failed to log {user_details['key']} to Google Sheets: {e}")
-    #    sheets_manager.log_failure(user_details['key'], f"Google Sheets logging failure: {str(e)}", sheet_name="Failures")
+    #    _sheets_manager.log_failure(user_details['key'], f"Google Sheets logging failure: {str(e)}", sheet_name="Failures")
     #    return video_details
 
-    # Step 9: Mark the user as processed in the shared directory
-    processed_users[user_key] = True
-
-    # Construct video details to return
+    # Construct video details to return; the parent uploads the local files and then marks the
+    # user as processed from its key
     video_details = {
         'key': user_details['key'],
         'voiceover_gcs_path': '',  # If needed, you could return this as well.
         'video_gcs_path': video_gcs_url,
         'cover_image_gcs_path': cover_image_gcs_url,
-        'video_duration': video_duration
+        'video_duration': video_duration,
+        'video_path': output_path,
+        'cover_image_path': image_path
     }
 
     # Memory Profiling at the end
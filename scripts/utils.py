@@ -1,18 +1,20 @@
 import os
 import psutil
 import logging
+from functools import lru_cache
 from dotenv import load_dotenv
-from moviepy.editor import TextClip
 import textwrap
 import json
 import re
-from num2words import num2words
 import unicodedata
 import html
-import re
-from moviepy.editor import VideoClip
 import numpy as np
-from PIL import Image, ImageDraw
+
+# orjson parses JSON several times faster than the stdlib; fall back to json when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Load environment variables
 load_dotenv()
@@ -25,17 +27,16 @@ def monitor_memory_usage(stage=""):
     memory_usage = process.memory_info().rss / (1024 * 1024)  # Convert to MB
     logger.info(f"Memory usage during {stage}: {memory_usage:.2f} MB")
 
+# Matches each digit followed by an even number of digits and then the last three,
+# i.e. the positions that take a comma in Indian grouping (12,34,567)
+_INDIAN_GROUPING_RE = re.compile(r'(\d)(?=(\d\d)*\d\d\d$)')
+
 # Format numbers in Indian style
 def format_in_indian_style(number, include_currency=True):
     try:
         s = str(number)
         if len(s) > 3:
-            last_three = s[-3:]
-            rest = s[:-3]
-            rest = rest[::-1]
-            rest = ','.join(rest[i:i+2] for i in range(0, len(rest), 2))
-            rest = rest[::-1]
-            formatted_number = rest + ',' + last_three
+            formatted_number = _INDIAN_GROUPING_RE.sub(r'\1,', s)
         else:
             formatted_number = s
         return f"₹{formatted_number}" if include_currency else formatted_number
@@ -43,39 +44,60 @@ def format_in_indian_style(number, include_currency=True):
         logger.error(f"Error formatting number {number}: {e}")
         return f"₹{number}" if include_currency else str(number)
 
+@lru_cache(maxsize=1024)
+def _fit_text(text, font, initial_font_size, box_width, box_height, max_lines):
+    """
+    Finds the font size and line wrapping at which the text fits the box, probing
+    sizes with ImageMagick-rendered TextClips. Memoized because the same texts
+    (static overlays, common names) recur across users and each probe is a
+    separate ImageMagick render.
+
+    Returns a tuple of (font_size, wrapped_text).
+    """
+    # moviepy is imported on first use so that importing utils stays light
+    from moviepy.editor import TextClip
+
+    # Initial font size
+    font_size = initial_font_size
+    wrapped_text = text
+
+    # Create initial TextClip without 'caption' method to avoid automatic wrapping
+    clip = TextClip(text, fontsize=font_size, font=font)
+
+    # Character limit per line based on box width
+    char_limit = len(text) * box_width // clip.size[0]
+
+    # Function to adjust line count and font size
+    def adjust_text_lines_and_font():
+        nonlocal wrapped_text, clip
+        # Start with one line
+        for lines in range(1, max_lines + 1):
+            # Split text into multiple lines based on char limit and number of lines
+            wrapped_text = "\n".join(textwrap.wrap(text, width=char_limit // lines))
+            clip = TextClip(wrapped_text, fontsize=font_size, font=font)
+
+            # Check if it fits both horizontally and vertically
+            if clip.size[0] <= box_width and clip.size[1] <= box_height:
+                break
+
+    # Try fitting with larger font and multiple lines
+    adjust_text_lines_and_font()
+
+    # If the text still doesn't fit, reduce the font size
+    while (clip.size[0] > box_width or clip.size[1] > box_height) and font_size > 25:
+        font_size -= 5
+        adjust_text_lines_and_font()
+
+    return font_size, wrapped_text
+
 # Get text clip for video
 def get_text_clip(text, position, font, initial_font_size, box, color='white', max_lines=3):
-    try:
-        # Initial font size
-        font_size = initial_font_size
-        text_lines = [text]
-
-        # Create initial TextClip without 'caption' method to avoid automatic wrapping
-        clip = TextClip(text, fontsize=font_size, color=color, font=font)
-
-        # Character limit per line based on box width
-        char_limit = len(text) * box['width'] // clip.size[0]
-
-        # Function to adjust line count and font size
-        def adjust_text_lines_and_font():
-            nonlocal font_size, text_lines, clip
-            # Start with one line
-            for lines in range(1, max_lines + 1):
-                # Split text into multiple lines based on char limit and number of lines
-                text_lines = textwrap.wrap(text, width=char_limit // lines)
-                clip = TextClip("\n".join(text_lines), fontsize=font_size, color=color, font=font)
-
-                # Check if it fits both horizontally and vertically
-                if clip.size[0] <= box['width'] and clip.size[1] <= box['height']:
-                    break
-
-        # Try fitting with larger font and multiple lines
-        adjust_text_lines_and_font()
+    from moviepy.editor import TextClip
 
-        # If the text still doesn't fit, reduce the font size
-        while (clip.size[0] > box['width'] or clip.size[1] > box['height']) and font_size > 25:
-            font_size -= 5
-            adjust_text_lines_and_font()
+    try:
+        # Find the fitting font size and wrapping, then render the clip once in its color
+        font_size, wrapped_text = _fit_text(text, font, initial_font_size, box['width'], box['height'], max_lines)
+        clip = TextClip(wrapped_text, fontsize=font_size, color=color, font=font)
 
         # Calculate the position within the box (centered)
         box_top_left_x = position['x']
@@ -89,27 +111,53 @@ def get_text_clip(text, position, font, initial_font_size, box, color='white', m
         logger.error(f"Error creating text clip for text '{text}': {e}")
         return None        
 
+_WHITESPACE_RE = re.compile(r'\s+')
+
+class _NonPrintableTable(dict):
+    """
+    str.translate table that deletes non-printable characters. Entries are filled in
+    the first time a code point is seen, so later lookups stay in C.
+    """
+    def __missing__(self, codepoint):
+        value = codepoint if chr(codepoint).isprintable() else None
+        self[codepoint] = value
+        return value
+
+_NON_PRINTABLE_TABLE = _NonPrintableTable()
+
 def sanitize_text(text):
     # Decode HTML entities
     text = html.unescape(text)
     # Normalize Unicode characters
     text = unicodedata.normalize('NFKC', text)
     # Remove non-printable characters
-    sanitized_text = ''.join(c for c in text if c.isprintable())
+    sanitized_text = text.translate(_NON_PRINTABLE_TABLE)
     # Replace any sequence of whitespace characters with a single space
-    sanitized_text = re.sub(r'\s+', ' ', sanitized_text)
+    sanitized_text = _WHITESPACE_RE.sub(' ', sanitized_text)
     sanitized_text = sanitized_text.strip()
     sanitized_text = sanitized_text.title()
     return sanitized_text
 
+def load_json_file(path):
+    """
+    Parses a JSON file, using orjson when available.
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+    return orjson.loads(content) if orjson else json.loads(content)
+
+@lru_cache(maxsize=16)
+def _read_configuration_cached(config_path, mtime):
+    return load_json_file(config_path)
+
 def read_configuration(config_path):
     """
     Reads a configuration JSON file and returns its content as a dictionary.
+    The parsed content is cached until the file changes, so callers must not modify it.
     """
     try:
         if os.path.exists(config_path):
-            with open(config_path, 'r', encoding="utf-8") as file:
-                return json.load(file)
+            return _read_configuration_cached(config_path, os.path.getmtime(config_path))
         else:
             logger.error(f"Configuration file {config_path} does not exist.")
             return {}
@@ -117,17 +165,21 @@ def read_configuration(config_path):
         logger.error(f"Error reading configuration file {config_path}: {e}")
         return {}
 
-def process_names(name_column):
+# First word of a name
+_NAME_RE = re.compile(r'[^\s|]+')
+
+def _first_names(name_column):
+    """
+    Returns the title-cased first name of every '|'-separated name, skipping empty entries.
+    """
     names = []
     for name in name_column.split('|'):
-        name = name.strip()
-        if not name:
-            continue  # Skip empty names
-        name_parts = name.split()
-        if not name_parts:
-            continue  # Skip if no name parts
-        first_name = name_parts[0].title()
-        names.append(first_name)
+        match = _NAME_RE.match(name.lstrip())
+        if match:
+            names.append(match.group().title())
+    return names
+
+def _join_names(names):
     if len(names) == 0:
         return ''
     elif len(names) == 1:
@@ -137,74 +189,73 @@ def process_names(name_column):
     else:
         return ", ".join(names[:-1]) + f", and {names[-1]}"
 
+def process_names(name_column):
+    return _join_names(_first_names(name_column))
+
 def process_names_respect(name_column):
-    names = []
-    for name in name_column.split('|'):
-        name = name.strip()
-        if not name:
-            continue  # Skip empty names
-        name_parts = name.split()
-        if not name_parts:
-            continue  # Skip if no name parts
-        first_name = name_parts[0].title()
-        names.append(first_name)
-    if len(names) == 0:
+    names = _first_names(name_column)
+    if not names:
         return ''
-    elif len(names) == 1:
-        return f"{names[0]} Ji"
-    elif len(names) == 2:
-        return f"{names[0]} and {names[1]} Ji"
-    else:
-        return ", ".join(names[:-1]) + f", and {names[-1]} Ji"
+    return f"{_join_names(names)} Ji"
 
 
 def draw_animated_box(position, dimensions, box_draw_duration, start_time, lifespan, box_color=(255, 255, 255), line_width=15):
     """
     Creates an animated effect where a transparent box is drawn around the given position and dimensions.
     """
+    from moviepy.editor import VideoClip
+
     try:
         box_width = dimensions['width'] + 30
         box_height = dimensions['height'] + 30
         x_pos = position['x'] - 15
         y_pos = position['y'] - 15
 
+        # Frame buffers are allocated once and redrawn in place on every frame
+        rgb = np.empty((box_height, box_width, 3), dtype=np.uint8)
+        alpha = np.empty((box_height, box_width), dtype=np.uint8)
+        mask = np.empty((box_height, box_width), dtype=np.float64)
+        half_width = line_width // 2
+
+        def draw_line(x0, y0, x1, y1):
+            # The box edges are axis-aligned, so each line is a rectangle centred on it
+            left, right = sorted((int(x0), int(x1)))
+            top, bottom = sorted((int(y0), int(y1)))
+            rows = slice(max(top - half_width, 0), bottom + half_width + 1)
+            cols = slice(max(left - half_width, 0), right + half_width + 1)
+            rgb[rows, cols] = box_color
+            alpha[rows, cols] = 255
+
         def make_frame(t):
-            # Create a fully transparent RGBA image
-            img = Image.new('RGBA', (box_width, box_height), (0, 0, 0, 0))  
-            draw = ImageDraw.Draw(img)
+            # Start from a fully transparent frame
+            rgb.fill(0)
+            alpha.fill(0)
             progress = t / box_draw_duration  # Progress of the drawing animation (0 to 1)
 
             # Drawing the box progressively
             if progress < 0.25:
                 line_length = box_width * (progress / 0.25)
-                draw.line([(0, 0), (line_length, 0)], fill=box_color, width=line_width)
+                draw_line(0, 0, line_length, 0)
             elif progress < 0.5:
-                draw.line([(0, 0), (box_width, 0)], fill=box_color, width=line_width)  
+                draw_line(0, 0, box_width, 0)
                 line_length = box_height * ((progress - 0.25) / 0.25)
-                draw.line([(box_width, 0), (box_width, line_length)], fill=box_color, width=line_width)
+                draw_line(box_width, 0, box_width, line_length)
             elif progress < 0.75:
-                draw.line([(0, 0), (box_width, 0)], fill=box_color, width=line_width)
-                draw.line([(box_width, 0), (box_width, box_height)], fill=box_color, width=line_width)  
+                draw_line(0, 0, box_width, 0)
+                draw_line(box_width, 0, box_width, box_height)
                 line_length = box_width * ((progress - 0.5) / 0.25)
-                draw.line([(box_width, box_height), (box_width - line_length, box_height)], fill=box_color, width=line_width)
+                draw_line(box_width, box_height, box_width - line_length, box_height)
             else:
-                draw.line([(0, 0), (box_width, 0)], fill=box_color, width=line_width)  
-                draw.line([(box_width, 0), (box_width, box_height)], fill=box_color, width=line_width)
-                draw.line([(box_width, box_height), (0, box_height)], fill=box_color, width=line_width)  
+                draw_line(0, 0, box_width, 0)
+                draw_line(box_width, 0, box_width, box_height)
+                draw_line(box_width, box_height, 0, box_height)
                 line_length = box_height * ((progress - 0.75) / 0.25)
-                draw.line([(0, box_height), (0, box_height - line_length)], fill=box_color, width=line_width)
+                draw_line(0, box_height, 0, box_height - line_length)
 
-            # Split the image into RGB and Alpha (transparency)
-            r, g, b, a = img.split()
+            # Normalize the alpha channel into the mask buffer
+            np.multiply(alpha, 1 / 255.0, out=mask)
 
-            # Convert the image to RGB for MoviePy compatibility
-            img_rgb = Image.merge('RGB', (r, g, b))
-
-            # Convert the image and alpha channel (mask) to numpy arrays
-            img_array = np.array(img_rgb)
-            mask_array = np.array(a) / 255.0  # Normalize the alpha channel
-
-            return img_array, mask_array
+            return rgb, mask
 
         # Create the animated box clip
         animated_box = VideoClip(lambda t: make_frame(t)[0], duration=box_draw_duration).set_position((x_pos, y_pos))
@@ -224,65 +275,111 @@ def draw_animated_box(position, dimensions, box_draw_duration, start_time, lifes
         logger.error(f"Error creating animated box draw: {e}")
         return None
 
+def get_ordinal_suffix(number):
+    if 10 <= number % 100 <= 20:
+        return f"{number}th"
+    else:
+        return f"{number}{['th', 'st', 'nd', 'rd', 'th'][min(number % 10, 4)]}"
+
+def remove_ordinal_suffix(value):
+    """
+    Removes the ordinal suffix from a value if it's already present (e.g., '15th' -> '15').
+    """
+    return ''.join(filter(str.isdigit, str(value)))  # Keeps only the digits, removing the 'th', 'st', etc.
+
+def clean_percentage(value):
+    """
+    Removes the '%' sign from a string and converts the result to a float.
+    If the value is already a float, it returns the value as is.
+    """
+    if isinstance(value, str):
+        return float(value.strip('%'))  # Remove any '%' sign and convert to float
+    return float(value)  # If already float, just return the value
+
+@lru_cache(maxsize=4096)
+def _number_to_words(number, to='cardinal'):
+    """
+    Memoized num2words; read-out values (rounded percentages, ranks) repeat across most users.
+    """
+    from num2words import num2words
+    return num2words(number, to=to)
+
+def _process_default(value):
+    if isinstance(value, int):
+        return str(value)
+    return sanitize_text(value)  # Default to sanitizing text for safety
+
+def _make_processor(processing_type, mapping):
+    """
+    Returns the function that formats a value for the given processing type.
+    """
+    if processing_type == 'name':
+        return process_names
+    elif processing_type == 'name_respect':
+        return process_names_respect
+    elif processing_type == 'ordinal':
+        return lambda value: _number_to_words(remove_ordinal_suffix(value), to='ordinal')
+    elif processing_type == 'float':
+        round_to = mapping.get('round_to', 2)
+        return lambda value: f"{float(value):.{round_to}f}"
+    elif processing_type == 'percentage_readout':
+        round_to = mapping.get('round_to', 0)
+        return lambda value: f"{_number_to_words(round(clean_percentage(value), round_to))} percent"
+    elif processing_type == 'percentile_readout':
+        round_to = mapping.get('round_to', 0)
+        return lambda value: f"{_number_to_words(round(clean_percentage(value), round_to))} percentile"
+    elif processing_type == 'integer':
+        return str
+    elif processing_type == 'percentage':
+        round_to = mapping.get('round_to', 0)
+        return lambda value: f"{round(value, round_to)}%"
+    elif processing_type == 'percentile':
+        round_to = mapping.get('round_to', 0)
+        return lambda value: f"{round(value, round_to)}%ile"
+    else:
+        return _process_default
+
+# Dispatch tables per (mapping, mode); the mapping is kept alongside so a recycled id() is never matched
+_dispatch_cache = {}
+
+def _get_dispatch(customer_info_mapping, mode):
+    """
+    Builds the {element: processor} table for a mapping and mode once, and reuses it for every user.
+    """
+    key = (id(customer_info_mapping), mode)
+    cached = _dispatch_cache.get(key)
+    if cached is None or cached[0] is not customer_info_mapping:
+        dispatch = {
+            element: _make_processor(mapping.get(mode, 'none'), mapping)
+            for element, mapping in customer_info_mapping.items()
+        }
+        cached = _dispatch_cache[key] = (customer_info_mapping, dispatch)
+    return cached[1]
+
 def process_customer_data(customer_data, customer_info_mapping, mode):
     """
     Processes the customer_info data based on the 'processing' rules in customer_info_mapping.
     Handles name sanitization, ordinal formatting, float rounding, etc.
     """
-    def get_ordinal_suffix(number):
-        if 10 <= number % 100 <= 20:
-            return f"{number}th"
-        else:
-            return f"{number}{['th', 'st', 'nd', 'rd', 'th'][min(number % 10, 4)]}"
-
-    def remove_ordinal_suffix(value):
-        """
-        Removes the ordinal suffix from a value if it's already present (e.g., '15th' -> '15').
-        """
-        return ''.join(filter(str.isdigit, str(value)))  # Keeps only the digits, removing the 'th', 'st', etc.
-
-    def clean_percentage(value):
-        """
-        Removes the '%' sign from a string and converts the result to a float.
-        If the value is already a float, it returns the value as is.
-        """
-        if isinstance(value, str):
-            return float(value.strip('%'))  # Remove any '%' sign and convert to float
-        return float(value)  # If already float, just return the value
-
-    processed_data = {}
+    dispatch = _get_dispatch(customer_info_mapping, mode)
+    return {
+        element: dispatch.get(element, _process_default)(value)
+        for element, value in customer_data.items()
+    }
+
+def process_customer_data_for_modes(customer_data, customer_info_mapping, modes):
+    """
+    Processes the customer_info data for several modes (e.g. audio and video processing)
+    in one pass, returning {mode: processed_data}. A field that uses the same processing
+    in more than one mode is formatted only once.
+    """
+    dispatches = [(mode, _get_dispatch(customer_info_mapping, mode)) for mode in modes]
+    processed = {mode: {} for mode in modes}
     for element, value in customer_data.items():
-        processing_type = customer_info_mapping.get(element, {}).get(mode, 'none')
-
-        if processing_type == 'name':
-            processed_data[element] = process_names(value)
-        elif processing_type == 'name_respect':
-            processed_data[element] = process_names_respect(value)        
-        elif processing_type == 'ordinal':
-            cleaned_value = remove_ordinal_suffix(value)
-            processed_data[element] = num2words(cleaned_value, to='ordinal')
-        elif processing_type == 'float':
-            round_to = customer_info_mapping.get(element, {}).get('round_to', 2)
-            processed_data[element] = f"{float(value):.{round_to}f}"
-        elif processing_type == 'percentage_readout':
-            round_to = customer_info_mapping.get(element, {}).get('round_to', 0)
-            cleaned_value = clean_percentage(value)  # Clean '%' before processing
-            processed_data[element] = f"{num2words(round(cleaned_value, round_to))} percent"
-        elif processing_type == 'percentile_readout':
-            round_to = customer_info_mapping.get(element, {}).get('round_to', 0)
-            cleaned_value = clean_percentage(value)  # Clean '%' before processing
-            processed_data[element] = f"{num2words(round(cleaned_value, round_to))} percentile"
-        elif processing_type == 'integer':
-            processed_data[element] = str(value)
-        elif processing_type == 'percentage':
-            round_to = customer_info_mapping.get(element, {}).get('round_to', 0)
-            processed_data[element]=f"{round(value,round_to)}%" 
-        elif processing_type == 'percentile':
-            round_to = customer_info_mapping.get(element, {}).get('round_to', 0)
-            processed_data[element]=f"{round(value,round_to)}%ile"     
-        else:
-            if isinstance(value, int):
-                processed_data[element] = str(value)
-            else:
-                processed_data[element] = sanitize_text(value)  # Default to sanitizing text for safety
-    return processed_data
+        results = {}
+        for mode, dispatch in dispatches:
+            processor = dispatch.get(element, _process_default)
+            if processor not in results:
+                results[processor] = processor(value)
+            processed[mode][element] = results[processor]
+    return processed
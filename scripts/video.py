@@ -1,6 +1,13 @@
 import os
 import logging
-from moviepy.editor import VideoFileClip, ColorClip, CompositeVideoClip, AudioFileClip, CompositeAudioClip
+import queue
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from moviepy.editor import VideoFileClip, ColorClip, CompositeVideoClip, AudioFileClip, CompositeAudioClip, ImageClip
 from utils import monitor_memory_usage, process_customer_data, get_text_clip, read_configuration, draw_animated_box
 from config_loader import templates_folder, background_music_path, video_config_path, imagemagick_binary_path
 import re
@@ -10,7 +17,7 @@ import os
 logger = logging.getLogger(__name__)
 
 # Verify ImageMagick installation
-from moviepy.config import change_settings
+from moviepy.config import change_settings, get_setting
 change_settings({"IMAGEMAGICK_BINARY": imagemagick_binary_path})
 
 def generate_text_clips(config, video_duration, overlay_data, debug_mode=False):
@@ -58,8 +65,14 @@ def generate_text_clips(config, video_duration, overlay_data, debug_mode=False):
             color = overlay.get('color', default_color)
 
             try:
-                # Generate text clip using `get_text_clip`
-                text_clip = get_text_clip(text_value, position, font, font_size, box, color)
+                # Generate text clip using `get_text_clip`; static text is rendered once per process
+                if 'text' in overlay:
+                    try:
+                        text_clip = _get_static_text_clip(text_value, position['x'], position['y'], font, font_size, box['width'], box['height'], color)
+                    except ValueError:
+                        text_clip = None  # Not cached, so the next user tries rendering it again
+                else:
+                    text_clip = get_text_clip(text_value, position, font, font_size, box, color)
                 if overlay.get('animated_box', {}).get('enabled', False):
                     animated_box = create_animated_box(overlay, computed_start_time, text_duration)
                     if animated_box:
@@ -70,7 +83,6 @@ def generate_text_clips(config, video_duration, overlay_data, debug_mode=False):
                     # Set the start time and duration for the text clip
                     text_clip = text_clip.set_start(computed_start_time).set_duration(text_duration)
                     text_clips.append(text_clip)
-                    text_clip.close()
                     #logger.info(f"Successfully created text clip for '{mark_name}' with text: '{text_value}' at time {computed_start_time}")
                 else:
                     logger.warning(f"Failed to create text clip for '{mark_name}'.")
@@ -97,7 +109,21 @@ def generate_text_clips(config, video_duration, overlay_data, debug_mode=False):
         logger.error(f"Error generating text clips: {e}")
         return None
 
-def generate_video(user_details, video_config, customer_info_mapping, audio_files, output_path, image_path):
+@lru_cache(maxsize=64)
+def _get_static_text_clip(text, x, y, font, font_size, width, height, color):
+    """
+    Renders a config-defined (static) text overlay once and shares it across users;
+    callers only derive timed copies of it with set_start/set_duration. A failed render
+    raises instead of returning None, so that lru_cache doesn't keep the failure.
+    """
+    text_clip = get_text_clip(text, {'x': x, 'y': y}, font, font_size, {'width': width, 'height': height}, color)
+    if text_clip is None:
+        raise ValueError(f"Failed to render static text clip '{text}'")
+    return text_clip
+
+def generate_video(user_details, video_config, customer_info_mapping, audio_files, output_path, image_path, processed_customer_data=None):
+    # Clips are closed once, in the finally block, after the video has been written
+    text_clips = []
     try:
         monitor_memory_usage(stage="before video generation")
 
@@ -109,7 +135,8 @@ def generate_video(user_details, video_config, customer_info_mapping, audio_file
             
         # Determine the background video based on the template selection key (e.g., city, performance)
         background_clip, video_duration = get_background_clip(video_config, customer_data)
-        processed_customer_data = process_customer_data(user_details['mapping_data'], customer_info_mapping, "video_processing")
+        if processed_customer_data is None:
+            processed_customer_data = process_customer_data(user_details['mapping_data'], customer_info_mapping, "video_processing")
 
         # Generate text clips
         text_clips = generate_text_clips(video_config, video_duration, processed_customer_data, False)
@@ -117,12 +144,12 @@ def generate_video(user_details, video_config, customer_info_mapping, audio_file
             raise ValueError(f"Failed to generate text clips for overlay data. Skipping video generation.")
         logger.info(f"Generated {len(text_clips)} text clips for {user_details['key']}")
 
-        # Generate audio clips
-        audio_clips = get_audio_clips(audio_files, video_config.get("audio_segments"))
+        # Collect the voiceover tracks to mix in
+        audio_tracks = get_audio_tracks(audio_files, video_config.get("audio_segments"))
 
-        logger.info(f"Generated {len(audio_clips)} audio clips for {user_details['key']}")
+        logger.info(f"Found {len(audio_tracks)} audio tracks for {user_details['key']}")
 
-        make_video(background_clip, audio_clips, text_clips, background_music_path, output_path, image_path, video_duration)
+        make_video(background_clip, audio_tracks, text_clips, background_music_path, output_path, image_path, video_duration)
 
         logger.info(f"Video generation completed for {user_details['key']}, saved at {output_path}")
         return video_duration
@@ -132,39 +159,35 @@ def generate_video(user_details, video_config, customer_info_mapping, audio_file
         return None
     finally:
         # Make sure all clips are released
-        for clip in text_clips:
+        for clip in text_clips or []:
             clip.close()  # Close text clips explicitly
-        for audio_clip in audio_clips:
-            audio_clip.close()  # Close audio clips explicitly
-        background_clip.close()  # Close the background clip
+        # The background clip is cached and reused across users, so it stays open
         monitor_memory_usage(stage="after video generation")
 
-def get_audio_clips(audio_files, audio_segments):
-    audio_clips = []
-    
+def get_audio_tracks(audio_files, audio_segments):
+    """
+    Pairs each configured audio segment with its synthesized file, returning a list of
+    (file_path, start_time) tuples for make_video to mix in.
+    """
     # Convert audio_files to a dictionary with segment_name as key
     audio_files_dict = {file_data["segment_name"]: file_data for file_data in audio_files}
-    
+
+    audio_tracks = []
     for segment in audio_segments:
         segment_name = segment["segment_name"].strip()  # Ensure no extra spaces
         
-        # Check if the segment exists in audio_files
+        # Check if the segment exists in audio_files (paths are normalized when written)
         if segment_name in audio_files_dict:
-            file_path = os.path.normpath(audio_files_dict[segment_name]["file"])  # Normalize path
-                        
-            # Load the audio file and set start time
-            audio = AudioFileClip(file_path)
-            audio = audio.set_start(segment["start_time"])
-            audio_clips.append(audio)
+            audio_tracks.append((audio_files_dict[segment_name]["file"], segment["start_time"]))
         else:
             # Log or handle missing segment
             logger.error(f"Audio segment '{segment_name}' not found in audio_files.")
-    
-    return audio_clips
 
-def get_background_clip(video_config, customer_data):
+    return audio_tracks
+
+def get_background_path(video_config, customer_data):
     """
-    Determines and loads the background video based on the client's configuration and customer data.
+    Determines the background video file based on the client's configuration and customer data.
     """
     # Determine the template selection key dynamically from config
     template_selection_key = video_config.get('template_selection_key', 'city')
@@ -178,11 +201,57 @@ def get_background_clip(video_config, customer_data):
         background_path = os.path.join(templates_folder, video_config['backgrounds'][template_selection_key].get('default', 'default.mp4'))
         logger.warning(f"Template for {template_value} not found. Using default background: {background_path}")
 
-    # Load the background video clip
-    background_clip = VideoFileClip(background_path)
+    return background_path
+
+def get_background_clip(video_config, customer_data):
+    """
+    Determines and loads the background video based on the client's configuration and customer data.
+    """
+    background_path = get_background_path(video_config, customer_data)
+
+    # Load the background video clip (shared with other users of the same template)
+    background_clip = _load_background(background_path, _target_resolution(video_config))
     video_duration = background_clip.duration
     return background_clip, video_duration
 
+# Backgrounds kept open per process. Users are sorted by template, so a worker mostly renders
+# one background after another; evicted clips are closed to release their ffmpeg reader
+BACKGROUND_CACHE_SIZE = int(os.getenv('BACKGROUND_CACHE_SIZE', 2))
+_background_cache = OrderedDict()
+
+def _target_resolution(video_config):
+    """
+    Returns the optional 'output_size' of the config ({"width": ..., "height": ...}) as the
+    (height, width) tuple VideoFileClip expects, or None to keep the template's own size.
+    Overlay positions and dimensions are in output pixels.
+    """
+    output_size = video_config.get('output_size')
+    if not output_size:
+        return None
+    return (output_size['height'], output_size['width'])
+
+def _load_background(background_path, target_resolution=None):
+    """
+    Opens a template background, reusing the clip (and its ffmpeg reader) for the following
+    users of the same template instead of re-probing the file each time; callers must not
+    close it. Only the BACKGROUND_CACHE_SIZE most recently used backgrounds stay open. Its own
+    audio track is never used, since make_video replaces it, so no audio reader is opened.
+    With a target resolution, ffmpeg scales the frames while decoding, before any compositing.
+    """
+    key = (background_path, target_resolution)
+    if key in _background_cache:
+        _background_cache.move_to_end(key)
+        return _background_cache[key]
+
+    background_clip = VideoFileClip(background_path, audio=False, target_resolution=target_resolution)
+    _background_cache[key] = background_clip
+
+    # The previous user's video is written by now, so an evicted background is no longer in use
+    while len(_background_cache) > BACKGROUND_CACHE_SIZE:
+        _, evicted_clip = _background_cache.popitem(last=False)
+        evicted_clip.close()
+    return background_clip
+
 def create_animated_box(overlay, start_time, lifespan):
     """
     Creates an animated box around the overlay text.
@@ -208,38 +277,298 @@ def create_animated_box(overlay, start_time, lifespan):
 
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+VIDEO_FPS = 24
+
+# NVENC preset and rate control (constant quality, no bitrate ceiling)
+NVENC_PRESET = 'p4'
+NVENC_PARAMS = ['-tune', 'll', '-rc', 'vbr', '-cq', '23', '-b:v', '0']
+
+@lru_cache(maxsize=1)
+def _nvenc_available():
+    """
+    Checks once per process whether ffmpeg can encode with h264_nvenc. A tiny test encode is
+    used rather than `ffmpeg -encoders`, which also lists NVENC on hosts without a usable GPU.
+    The probe uses the real encode's preset and rate-control options, so that an ffmpeg or
+    driver that rejects them falls back to libx264 here instead of failing every video.
+    """
+    try:
+        result = subprocess.run(
+            [get_setting("FFMPEG_BINARY"), '-hide_banner', '-loglevel', 'error',
+             '-f', 'lavfi', '-i', 'color=size=256x256:duration=0.1',
+             '-c:v', 'h264_nvenc', '-preset', NVENC_PRESET] + NVENC_PARAMS + ['-f', 'null', '-'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30
+        )
+        available = result.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        available = False
+
+    logger.info(f"Encoding videos with {'h264_nvenc' if available else 'libx264'}")
+    return available
+
+# Composited frames rendered ahead of the encoder; bounds memory at a few frames
+FRAME_QUEUE_SIZE = 8
+
+def _iter_frames_prefetched(clip, fps):
+    """
+    Yields the clip's frames while a background thread renders the following ones, so
+    compositing frame N+1 overlaps with piping frame N into the encoder.
+    """
+    frames = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        # Give up if the consumer has stopped, instead of blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for frame in clip.iter_frames(fps=fps, dtype='uint8'):
+                if not put(frame):
+                    return
+            put(end)
+        except Exception as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+# Size of the buffer in front of the encoder's stdin (io's default is 8 KiB). A frame larger
+# than the buffer goes straight to the pipe in one write; smaller frames, e.g. at reduced
+# output sizes, are collected into writes of up to 1 MiB, so there are fewer system calls
+ENCODER_PIPE_BUFFER_SIZE = 1 << 20
+
+def _open_encoder(output_path, size, fps):
+    """
+    Starts an ffmpeg process that encodes raw RGB frames from its stdin into a video-only
+    output_path. Mirrors the command moviepy's FFMPEG_VideoWriter builds.
+    """
+    if _nvenc_available():
+        codec, preset, ffmpeg_params = 'h264_nvenc', NVENC_PRESET, NVENC_PARAMS
+    else:
+        codec, preset, ffmpeg_params = 'libx264', 'medium', []
+
+    width, height = size
+    cmd = [
+        get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', f"{width}x{height}", '-pix_fmt', 'rgb24',
+        '-r', f"{fps:.02f}", '-an', '-i', '-'
+    ]
+    cmd += ['-an', '-vcodec', codec, '-preset', preset] + ffmpeg_params
+    if width % 2 == 0 and height % 2 == 0:
+        cmd += ['-pix_fmt', 'yuv420p']
+    cmd.append(output_path)
+
+    return subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=tempfile.TemporaryFile(),
+        bufsize=ENCODER_PIPE_BUFFER_SIZE
+    )
+
+def _encoder_error(proc):
+    proc.stderr.seek(0)
+    return proc.stderr.read().decode(errors='replace').strip()
+
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=10))  # Retry 3 times with exponential backoff
-def write_video_with_retry(video, output_path):
-    video.write_videofile(output_path, codec='libx264', fps=24, logger=None)
+def write_video_with_retry(video, output_path, fps=VIDEO_FPS):
+    proc = _open_encoder(output_path, video.size, fps)
+    try:
+        # Frames are contiguous uint8 arrays, so their buffers are written without a tobytes() copy
+        for frame in _iter_frames_prefetched(video, fps):
+            proc.stdin.write(frame.data)
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise IOError(f"ffmpeg failed to encode {output_path}: {_encoder_error(proc)}")
+    except BrokenPipeError:
+        proc.wait()
+        raise IOError(f"ffmpeg exited while encoding {output_path}: {_encoder_error(proc)}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stderr.close()
+
+# Soundtrack mix: background music volume and fade-out (seconds), output sample rate
+BACKGROUND_MUSIC_VOLUME = 0.25
+BACKGROUND_MUSIC_FADEOUT = 2
+AUDIO_SAMPLE_RATE = 44100
 
-def make_video(background_clip, audio_clips, text_clips, background_music_path, output_path, image_path, video_duration):
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=10))  # Retry 3 times with exponential backoff
+def mux_audio_with_retry(video_path, output_path, background_music_path, audio_tracks, video_duration):
+    """
+    Mixes the background music and the voiceover tracks with ffmpeg's filters and muxes
+    the result with the encoded video, which is stream-copied rather than re-encoded.
+    Only filter options from older ffmpeg releases are used (no adelay all=1, no amix
+    normalize), so the distro and imageio-ffmpeg builds moviepy runs with work too.
+
+    :param video_path: Path of the video-only encode.
+    :param output_path: Path of the final video.
+    :param background_music_path: Path of the background music, trimmed to the video.
+    :param audio_tracks: List of (file_path, start_time) voiceover tracks.
+    :param video_duration: Duration of the video in seconds.
+    """
+    fade_start = max(0, video_duration - BACKGROUND_MUSIC_FADEOUT)
+    inputs = ['-i', video_path, '-i', background_music_path]
+    # Every track is padded with silence past its end, so amix never sees an input drop out
+    filters = [
+        f"[1:a]atrim=0:{video_duration},asetpts=PTS-STARTPTS,volume={BACKGROUND_MUSIC_VOLUME},"
+        f"afade=t=out:st={fade_start}:d={BACKGROUND_MUSIC_FADEOUT},apad[bgm]"
+    ]
+    mix_inputs = ['[bgm]']
+    for index, (file_path, start_time) in enumerate(audio_tracks, start=2):
+        inputs += ['-i', file_path]
+        delay = int(round(start_time * 1000))
+        filters.append(f"[{index}:a]adelay={delay}|{delay},apad[a{index}]")
+        mix_inputs.append(f"[a{index}]")
+
+    # amix averages its inputs; with all of them active throughout, scaling by their count sums
+    # the tracks as moviepy's CompositeAudioClip did. The padded mix is cut to the video's length
+    filters.append(
+        f"{''.join(mix_inputs)}amix=inputs={len(mix_inputs)}:duration=longest,"
+        f"volume={len(mix_inputs)},atrim=0:{video_duration}[audio]"
+    )
+
+    cmd = [get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error'] + inputs + [
+        '-filter_complex', ';'.join(filters),
+        '-map', '0:v', '-map', '[audio]',
+        '-c:v', 'copy', '-c:a', 'aac', '-ar', str(AUDIO_SAMPLE_RATE),
+        '-t', f"{video_duration:.3f}",
+        output_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise IOError(f"ffmpeg failed to mux audio into {output_path}: {result.stderr.decode(errors='replace').strip()}")
+
+def _is_static_overlay(clip):
+    """
+    True for overlays that look the same on every frame: an image with a static mask at a
+    fixed position, shown over a known interval (text clips, debug boxes).
+    """
+    if not isinstance(clip, ImageClip) or clip.end is None:
+        return False
+    if clip.mask is not None and not isinstance(clip.mask, ImageClip):
+        return False
+    position = clip.pos(clip.start)
+    return all(isinstance(value, (int, float)) for value in position)
+
+def _fold_overlays(clips, start, end):
+    """
+    Alpha-composites static overlays (in list order) into a single overlay clip covering
+    their bounding box, shown from start to end.
+    """
+    placements = []
+    for clip in clips:
+        x, y = (int(value) for value in clip.pos(clip.start))
+        height, width = clip.img.shape[:2]
+        placements.append((clip, x, y, width, height))
+
+    left = min(x for _, x, _, _, _ in placements)
+    top = min(y for _, _, y, _, _ in placements)
+    right = max(x + width for _, x, _, width, _ in placements)
+    bottom = max(y + height for _, _, y, _, height in placements)
+
+    # Premultiplied colour and coverage of the folded plane
+    color = np.zeros((bottom - top, right - left, 3), dtype=np.float32)
+    alpha = np.zeros((bottom - top, right - left), dtype=np.float32)
+    for clip, x, y, width, height in placements:
+        region = (slice(y - top, y - top + height), slice(x - left, x - left + width))
+        clip_alpha = clip.mask.img.astype(np.float32) if clip.mask is not None else np.ones((height, width), dtype=np.float32)
+        inverse = 1 - clip_alpha
+        color[region] = clip.img[:, :, :3] * clip_alpha[:, :, None] + color[region] * inverse[:, :, None]
+        alpha[region] = clip_alpha + alpha[region] * inverse
+
+    # moviepy blends with straight (non-premultiplied) colour
+    np.divide(color, alpha[:, :, None], out=color, where=alpha[:, :, None] > 0)
+    mask = ImageClip(alpha, ismask=True)
+    plane = ImageClip(np.clip(color, 0, 255).astype(np.uint8)).set_mask(mask)
+    return plane.set_position((left, top)).set_start(start).set_end(end)
+
+def build_overlay_timeline(clips):
+    """
+    Folds overlays that are visible at the same time into one pre-composited plane per
+    interval, so each frame blends one clip for them instead of one per overlay.
+
+    Only runs of consecutive static overlays are folded, which keeps the stacking order
+    of animated boxes (and any other per-frame clip) between them unchanged.
+    """
+    timeline = []
+    run = []
+
+    def flush_run():
+        # Split the run's span at every start/end; each piece has a fixed set of visible overlays
+        boundaries = sorted({clip.start for clip in run} | {clip.end for clip in run})
+        for start, end in zip(boundaries, boundaries[1:]):
+            visible = [clip for clip in run if clip.start <= start and clip.end >= end]
+            if len(visible) == 1 and visible[0].start == start and visible[0].end == end:
+                timeline.append(visible[0])
+            elif len(visible) == 1:
+                timeline.append(visible[0].set_start(start).set_end(end))
+            elif visible:
+                timeline.append(_fold_overlays(visible, start, end))
+        run.clear()
+
+    for clip in clips:
+        if _is_static_overlay(clip):
+            run.append(clip)
+        else:
+            if run:
+                flush_run()
+            timeline.append(clip)
+    if run:
+        flush_run()
+
+    return timeline
+
+def make_video(background_clip, audio_tracks, text_clips, background_music_path, output_path, image_path, video_duration):
+    video = None
+    video_only_path = f"{os.path.splitext(output_path)[0]}_TEMP_video.mp4"
     try:
-        # Load the background music, set its volume, and subclip to the desired video duration
-        background_music = AudioFileClip(background_music_path).subclip(0, video_duration).volumex(0.25).audio_fadeout(2)
-        
-        # Create a composite audio clip from all the audio clips including background music
-        composite_audio = CompositeAudioClip([background_music] + audio_clips)
-        
-        # Add audio to the background video
-        background_clip = background_clip.set_audio(composite_audio)
-        
-        # Create a composite video with text clips (assuming text_clips are video clips with text)
-        video = CompositeVideoClip([background_clip] + text_clips)
+        # Create a composite video with text clips (assuming text_clips are video clips with text);
+        # overlays shown together are pre-composited so each frame blends fewer layers. The opaque
+        # background itself is the canvas, rather than being pasted onto a black ColorClip first.
+        # With use_bgclip the composite's length comes from the overlays alone, so it is set to the
+        # background's duration to keep the template running after the last overlay ends
+        video = CompositeVideoClip([background_clip] + build_overlay_timeline(text_clips), use_bgclip=True)
+        video = video.set_duration(video_duration)
         
         # Write the video to the output file
         #video.write_videofile(output_path, codec='libx264', fps=24, logger=None)
         
-        # Write the video with retry logic
-        write_video_with_retry(video, output_path)
+        # Write the video with retry logic, at the template's own frame rate so that every
+        # background frame is used once instead of being resampled to VIDEO_FPS
+        target_fps = background_clip.fps or VIDEO_FPS
+        write_video_with_retry(video, video_only_path, target_fps)
+
+        # Mix the background music and voiceovers in ffmpeg and mux them with the encoded video
+        mux_audio_with_retry(video_only_path, output_path, background_music_path, audio_tracks, video_duration)
 
         # Verify that the video was generated successfully
         if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
             raise ValueError(f"Generated video file is invalid or corrupted: {output_path}")
 
-        # Save a frame of the video for use as a thumbnail or reference image
-        with VideoFileClip(output_path) as video_clip:
-            frame_time = max(0, video_clip.duration - 2)
-            video_clip.save_frame(image_path, t=frame_time)
+        # Save a frame of the video for use as a thumbnail or reference image, rendered from
+        # the composite still in memory rather than by decoding the written file again
+        frame_time = max(0, video.duration - 2)
+        video.save_frame(image_path, t=frame_time)
 
         monitor_memory_usage(stage="after video generation")
         #logger.info(f"Generated video successfully saved at {output_path}")
@@ -249,8 +578,7 @@ def make_video(background_clip, audio_clips, text_clips, background_music_path,
     
     finally:
         # Ensure all resources are released after the video is written
-        video.close()  # Close the composite video clip
-        for audio_clip in audio_clips:
-            audio_clip.close()  # Close audio clips explicitly
-        background_clip.close()  # Close the background clip explicitly
-        composite_audio.close()  # Close composite audio explicitly
+        if video is not None:
+            video.close()  # Close the composite video clip
+        if os.path.exists(video_only_path):
+            os.remove(video_only_path)
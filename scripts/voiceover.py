@@ -1,42 +1,64 @@
 import os
 import logging
 import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from google.cloud import texttospeech_v1beta1 as texttospeech
 from utils import process_customer_data, monitor_memory_usage
 from config_loader import voiceovers_dir, service_account_key_path
+from auth import get_credentials
 import re
 import json
 
 logger = logging.getLogger(__name__)
 
-def generate_voiceover_script(user_details, customer_info_mapping, audio_segments):
+# Any {placeholder} in a template segment; segments without one read the same for every user
+TEMPLATE_PLACEHOLDER_PATTERN = re.compile(r'\{[^{}]+\}')
+
+def generate_voiceover_script(user_details, customer_info_mapping, audio_segments, processed_customer_data=None):
     """
     Generates the SSML script for the voiceover based on the user details and customer info mapping
     The template is a JSON file with placeholders for customer data.
-    This version returns the updated JSON structure with populated placeholders.
+    This version returns a copy of the JSON structure with populated placeholders;
+    the template itself is left untouched since it is shared across users.
+    Callers that already processed the data for "audio_processing" can pass it in.
+    Segments whose template has no placeholders are flagged 'cacheable'.
     """
     try:
         #monitor_memory_usage("After reading voiceover template")
 
         # Process customer data based on the mapping for audio processing
-        processed_customer_data = process_customer_data(user_details['mapping_data'], customer_info_mapping, "audio_processing")
+        if processed_customer_data is None:
+            processed_customer_data = process_customer_data(user_details['mapping_data'], customer_info_mapping, "audio_processing")
+
+        # One pattern matching every {placeholder}, so each segment is scanned once
+        replacements = {placeholder: str(value) for placeholder, value in processed_customer_data.items()}
+        placeholder_pattern = re.compile(r'\{(' + '|'.join(map(re.escape, replacements)) + r')\}') if replacements else None
 
         # Iterate through each audio segment and format the 'speech_text'
+        populated_segments = []
         for segment in audio_segments:
             speech_text = segment['speech_text']
             
             # Replace placeholders in 'speech_text' with actual values from processed_customer_data
-            for placeholder, value in processed_customer_data.items():
-                speech_text = speech_text.replace(f'{{{placeholder}}}', str(value))
+            if placeholder_pattern:
+                speech_text = placeholder_pattern.sub(lambda match: replacements[match.group(1)], speech_text)
             
-            # Update the 'speech_text' in the template with formatted SSML
-            segment['speech_text'] = speech_text
+            # Copy the segment with the formatted SSML as its 'speech_text'; only user-independent
+            # segments may be served from the synthesized audio cache
+            populated_segments.append({
+                **segment,
+                'speech_text': speech_text,
+                'cacheable': not TEMPLATE_PLACEHOLDER_PATTERN.search(segment['speech_text'])
+            })
 
         #monitor_memory_usage("After generating SSML script")
 
-        # Return the modified template as a JSON object
-        logger.info(f"Generated SSML for {len(audio_segments)} segments for: {user_details['key']}")
-        return audio_segments
+        # Return the populated template as a JSON object
+        logger.info(f"Generated SSML for {len(populated_segments)} segments for: {user_details['key']}")
+        return populated_segments
 
     except (FileNotFoundError, IOError) as file_error:
         logger.error(f"File error: {file_error}")
@@ -47,44 +69,47 @@ def generate_voiceover_script(user_details, customer_info_mapping, audio_segment
         raise
 
 
+# Segments synthesized concurrently per user; the RPCs are network-bound
+TTS_MAX_WORKERS = int(os.getenv('TTS_MAX_WORKERS', 8))
+
 def generate_audio_files(audio_segments, audio_config, user_details, voiceovers_dir=voiceovers_dir):
     try:
         # Placeholder for combined audio files, time marks, and synthesis times
         combined_audio_data = []
         total_synthesis_time = 0
 
-        # Iterate through each audio segment in the JSON
-        for idx, segment in enumerate(audio_segments):
-            segment_name = segment['segment_name']
-            segment_script = segment['speech_text']
-                      
-            # Call the function to generate audio for each segment
-            audio_content, time_marks, synthesis_time = generate_audio_content(
-                segment_script,
-                audio_config,
-                user_details
+        # Ensure the user's voiceover directory exists
+        user_voiceovers_dir = os.path.join(voiceovers_dir, user_details['key'])
+        os.makedirs(user_voiceovers_dir, exist_ok=True)
+
+        # Synthesize all segments concurrently; results come back in segment order
+        with ThreadPoolExecutor(max_workers=max(1, min(TTS_MAX_WORKERS, len(audio_segments)))) as executor:
+            results = executor.map(
+                lambda segment: generate_audio_content(segment['speech_text'], audio_config, user_details, segment.get('cacheable', False)),
+                audio_segments
             )
-            
-            # Define the file path for the generated audio
-            audio_file_path = os.path.join(voiceovers_dir, user_details['key'], f"audio_part_{idx + 1}.mp3")
-            
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(audio_file_path), exist_ok=True)
 
-            # Save the audio content to the specified file path
-            with open(audio_file_path, 'wb') as audio_file:
-                audio_file.write(audio_content)
-            
-            # Store the information for this segment
-            combined_audio_data.append({
-                "segment_name": segment_name,
-                "file": audio_file_path,
-                "time_marks": time_marks,
-                "synthesis_time": synthesis_time
-            })
-            
-            # Update total synthesis time
-            total_synthesis_time += synthesis_time
+            # Iterate through each audio segment in the JSON
+            for idx, (segment, (audio_content, time_marks, synthesis_time)) in enumerate(zip(audio_segments, results)):
+                segment_name = segment['segment_name']
+
+                # Define the file path for the generated audio
+                audio_file_path = os.path.normpath(os.path.join(user_voiceovers_dir, f"audio_part_{idx + 1}.mp3"))
+
+                # Save the audio content to the specified file path
+                with open(audio_file_path, 'wb') as audio_file:
+                    audio_file.write(audio_content)
+                
+                # Store the information for this segment
+                combined_audio_data.append({
+                    "segment_name": segment_name,
+                    "file": audio_file_path,
+                    "time_marks": time_marks,
+                    "synthesis_time": synthesis_time
+                })
+                
+                # Update total synthesis time
+                total_synthesis_time += synthesis_time
         
         logger.info(f"All audio segments processed successfully for user {user_details['key']}.")
 
@@ -95,30 +120,102 @@ def generate_audio_files(audio_segments, audio_config, user_details, voiceovers_
         logger.error(f"Error during processing segments for {user_details['key']}: {e}")
         return [], 0
 
-def generate_audio_content(script, audio_config, user_details):
+@lru_cache(maxsize=1)
+def get_tts_client():
+    """
+    Returns the process-wide Text-to-Speech client, so its channel (and the parsed
+    service account key) is reused across segments and users.
+    """
+    return texttospeech.TextToSpeechClient(credentials=get_credentials(service_account_key_path))
+
+@lru_cache(maxsize=4)
+def _voice_params(audio_config_key):
+    """
+    Builds the voice selection and audio parameters for an audio config, keyed by its
+    JSON serialization since the config dict itself can't be hashed.
+    """
+    audio_config = json.loads(audio_config_key)
+
+    # Configure voice properties
+    voice = texttospeech.VoiceSelectionParams(
+        name=audio_config['voice_name'],
+        ssml_gender=texttospeech.SsmlVoiceGender.MALE,
+        language_code=audio_config['language_code']
+    )
+
+    # Configure audio parameters
+    audio_config_params = texttospeech.AudioConfig(
+        audio_encoding=getattr(texttospeech.AudioEncoding, audio_config['audio_encoding']),
+        pitch=audio_config['pitch'],
+        volume_gain_db=audio_config['volume_gain_db'],
+        speaking_rate=audio_config['speaking_rate'],
+        sample_rate_hertz=audio_config['sample_rate_hertz'],
+        effects_profile_id=[audio_config['effects_profile_id']]
+    )
+    return voice, audio_config_params
+
+# Synthesized audio shared across users, keyed by a hash of the SSML and the audio config
+TTS_CACHE_DIR_NAME = "_cache"
+
+def _tts_cache_dir():
+    """
+    Returns the directory of the synthesized audio cache. It is resolved on use rather than
+    at import, so an unset VOICEOVERS_DIR is reported by config validation instead.
+    """
+    return os.path.join(voiceovers_dir, TTS_CACHE_DIR_NAME)
+
+def _read_cached_audio(cache_key):
+    """
+    Returns the cached (audio_content, time_marks) for a key, or None on a miss.
+    """
+    cache_dir = _tts_cache_dir()
+    audio_path = os.path.join(cache_dir, f"{cache_key}.mp3")
+    marks_path = os.path.join(cache_dir, f"{cache_key}.json")
+    try:
+        with open(marks_path) as marks_file:
+            time_marks = json.load(marks_file)
+        with open(audio_path, 'rb') as audio_file:
+            return audio_file.read(), time_marks
+    except (OSError, ValueError):
+        return None
+
+def _write_cached_audio(cache_key, audio_content, time_marks):
+    """
+    Stores synthesized audio in the cache. Files are written under temporary names and
+    moved into place, so concurrent workers never read a partial entry; the time marks
+    go last because their presence marks the entry as complete.
+    """
+    def write_atomically(path, mode, data):
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, mode) as cache_file:
+            cache_file.write(data)
+        os.replace(temp_path, path)
+
+    try:
+        cache_dir = _tts_cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        write_atomically(os.path.join(cache_dir, f"{cache_key}.mp3"), 'wb', audio_content)
+        write_atomically(os.path.join(cache_dir, f"{cache_key}.json"), 'w', json.dumps(time_marks))
+    except OSError as e:
+        logger.warning(f"Could not cache synthesized audio {cache_key}: {e}")
+
+def generate_audio_content(script, audio_config, user_details, cacheable=False):
     try:
         # Memory profiling before audio synthesis
         #monitor_memory_usage("Before audio synthesis")
 
-        # Initialize Google TTS client
-        client = texttospeech.TextToSpeechClient.from_service_account_file(service_account_key_path)
+        # Segments whose SSML doesn't vary per user (intros, outros) are synthesized only once;
+        # personalized segments are never cached, so the cache stays as small as the template
+        audio_config_key = json.dumps(audio_config, sort_keys=True)
+        cache_key = hashlib.blake2b((script + audio_config_key).encode(), digest_size=16).hexdigest() if cacheable else None
+        cached = _read_cached_audio(cache_key) if cacheable else None
+        if cached:
+            audio_content, time_marks = cached
+            return audio_content, time_marks, 0
 
-        # Configure voice properties
-        voice = texttospeech.VoiceSelectionParams(
-            name=audio_config['voice_name'],
-            ssml_gender=texttospeech.SsmlVoiceGender.MALE,
-            language_code=audio_config['language_code']
-        )
-
-        # Configure audio parameters
-        audio_config_params = texttospeech.AudioConfig(
-            audio_encoding=getattr(texttospeech.AudioEncoding, audio_config['audio_encoding']),
-            pitch=audio_config['pitch'],
-            volume_gain_db=audio_config['volume_gain_db'],
-            speaking_rate=audio_config['speaking_rate'],
-            sample_rate_hertz=audio_config['sample_rate_hertz'],
-            effects_profile_id=[audio_config['effects_profile_id']]
-        )
+        # Reuse the shared Google TTS client and the voice/audio parameters for this config
+        client = get_tts_client()
+        voice, audio_config_params = _voice_params(audio_config_key)
 
         # Prepare SSML synthesis input
         synthesis_input = texttospeech.SynthesisInput(ssml=script)
@@ -145,11 +242,14 @@ def generate_audio_content(script, audio_config, user_details):
             else:
                 logger.warning(f"Invalid timepoint for mark {tp.mark_name} for user {user_details['key']}")
 
+        if cacheable:
+            _write_cached_audio(cache_key, audio_content, time_marks)
+
         # Memory profiling after audio synthesis
         #monitor_memory_usage("After audio synthesis")
 
         # Memory Management: Free up resources explicitly
-        del client, synthesis_input, request, response  # Release resources after processing
+        del synthesis_input, request, response  # Release resources after processing; the client is shared
         #monitor_memory_usage("After resource cleanup")
 
         return audio_content, time_marks, synthesis_time